@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Measure the cold start of the scripts linked by pipis, with and without bytecode.
+
+The first script of each installed package (or of the given packages) is run
+several times, in two conditions:
+
+- `source`: bytecode is ignored and never written, as in a venv on a read-only
+  mount, or installed without precompilation, on its first launch;
+- `bytecode`: the bytecode precompiled in the venv is used.
+
+    python benchmarks/coldstart.py --runs 5 --output coldstart.json flake8
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from pipis.utils import Pipis
+
+
+def run(script: str, args: list, env: dict) -> float:
+    """Run a script once.
+
+    :param script: Script path
+    :type script: str
+    :param args: Script arguments
+    :type args: list
+    :param env: Environment variables
+    :type env: dict
+    :return: Wall time in milliseconds
+    :rtype: float
+    """
+
+    start = time.perf_counter()
+    subprocess.run(
+        [script] + args, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    return (time.perf_counter() - start) * 1000
+
+
+def bench(packages: list, args: list, runs: int) -> dict:
+    """Benchmark the first script of each package.
+
+    :param packages: Packages names, all installed packages when empty
+    :type packages: list
+    :param args: Scripts arguments
+    :type args: list
+    :param runs: Number of runs per condition
+    :type runs: int
+    :return: Results by script name
+    :rtype: dict
+    """
+
+    index = Pipis()._installed_packages()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source_env = dict(os.environ)
+        source_env["PYTHONDONTWRITEBYTECODE"] = "1"
+        # an empty prefix hides the bytecode of the venv (python 3.8+)
+        source_env["PYTHONPYCACHEPREFIX"] = tmp_dir
+        for package in packages or sorted(index):
+            if not index.get(package, {}).get("scripts"):
+                continue
+            script = index[package]["scripts"][0]
+            timings = {}
+            for name, env in (("source", source_env), ("bytecode", dict(os.environ))):
+                timings[name] = statistics.median(
+                    run(script, args, env) for _ in range(runs)
+                )
+            results[Path(script).name] = {
+                "package": package,
+                "source_ms": round(timings["source"], 2),
+                "bytecode_ms": round(timings["bytecode"], 2),
+                "speedup": round(timings["source"] / timings["bytecode"], 2),
+            }
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("package", nargs="*", help="packages (default: all)")
+    parser.add_argument("--runs", type=int, default=5, help="runs per condition")
+    parser.add_argument(
+        "--args", default="--version", help="scripts arguments (default: --version)"
+    )
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    results = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "args": args.args,
+        "scripts": bench(args.package, args.args.split(), args.runs),
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""Benchmark pipis on a synthetic farm of venvs.
+
+A fake `PIPIS_VENVS` tree is generated for each farm size: venvs with a
+`.dist-info` directory (METADATA, RECORD, entry_points.txt), scripts in `bin/`,
+and a `PIPIS_BIN` directory linking them. No network nor pip is needed.
+
+    python benchmarks/farm.py --sizes 10 100 1000 --output farm.json
+    python benchmarks/farm.py --sizes 10 100 1000 --compare farm.json
+"""
+
+import argparse
+from contextlib import redirect_stdout
+import io
+import json
+import os
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+import time
+
+from pipis.utils import Pipis
+
+
+def make_venv(venvs: Path, package: str, record_lines: int, scripts: int) -> Path:
+    """Create a fake package venv.
+
+    :param venvs: Venvs directory
+    :type venvs: Path
+    :param package: Package name
+    :type package: str
+    :param record_lines: Number of files listed in RECORD
+    :type record_lines: int
+    :param scripts: Number of scripts
+    :type scripts: int
+    :return: Venv path
+    :rtype: Path
+    """
+
+    version = "1.0.0"
+    venv_dir = venvs / package
+    venv_bin = venv_dir / "bin"
+    venv_site = venv_dir / "lib" / "python3.6" / "site-packages"
+    dist_info = venv_site / f"{package}-{version}.dist-info"
+    dist_info.mkdir(parents=True)
+    venv_bin.mkdir()
+    (venv_bin / "python").symlink_to(sys.executable)
+    (venv_dir / "pyvenv.cfg").write_text("home = /usr/bin\nversion = 3.6.8\n")
+    (dist_info / "METADATA").write_text(
+        f"Metadata-Version: 2.1\nName: {package}\nVersion: {version}\n\n"
+        + "Long description.\n" * 50
+    )
+    (dist_info / "INSTALLER").write_text("pip\n")
+
+    record = [
+        f"{package}/module_{i}.py,sha256=47DEQpj8HBSa-_TImW-5JCeuQeRkm5NMpJWZG3hSuFU,"
+        f"{i}"
+        for i in range(record_lines)
+    ]
+    entry_points = ["[console_scripts]"]
+    for i in range(scripts):
+        script = f"{package}-{i}" if i else package
+        script_path = venv_bin / script
+        script_path.write_text(f"#!{venv_bin / 'python'}\nimport {package}\n")
+        script_path.chmod(0o755)
+        record.append(f"../../../bin/{script},,")
+        entry_points.append(f"{script} = {package}.cli:main")
+    record.append(f"{package}-{version}.dist-info/RECORD,,")
+    (dist_info / "RECORD").write_text("\n".join(record) + "\n")
+    (dist_info / "entry_points.txt").write_text("\n".join(entry_points) + "\n")
+
+    return venv_dir
+
+
+def make_farm(root: Path, size: int, record_lines: int, scripts: int) -> Pipis:
+    """Create a farm of fake venvs, with their scripts linked.
+
+    :param root: Farm root directory
+    :type root: Path
+    :param size: Number of venvs
+    :type size: int
+    :param record_lines: Number of files listed in each RECORD
+    :type record_lines: int
+    :param scripts: Number of scripts per venv
+    :type scripts: int
+    :return: Pipis instance configured for the farm
+    :rtype: Pipis
+    """
+
+    venvs, bins = root / "venvs", root / "bin"
+    venvs.mkdir()
+    bins.mkdir()
+    for i in range(size):
+        package = f"package{i:05d}"
+        venv_dir = make_venv(venvs, package, record_lines, scripts)
+        for script in (venv_dir / "bin").iterdir():
+            if script.name != "python":
+                (bins / script.name).symlink_to(script)
+
+    return Pipis(config={"venvs": str(venvs), "bin": str(bins)})
+
+
+def timed(func, *args, **kwargs) -> float:
+    """Call a function with its output discarded.
+
+    :param func: Function
+    :type func: callable
+    :return: Elapsed time in milliseconds
+    :rtype: float
+    """
+
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        func(*args, **kwargs)
+
+    return (time.perf_counter() - start) * 1000
+
+
+def bench(size: int, record_lines: int, scripts: int, sample: int) -> dict:
+    """Benchmark pipis operations on a farm.
+
+    :param size: Number of venvs
+    :type size: int
+    :param record_lines: Number of files listed in each RECORD
+    :type record_lines: int
+    :param scripts: Number of scripts per venv
+    :type scripts: int
+    :param sample: Maximum number of venvs used by per-package operations
+    :type sample: int
+    :return: Timings in milliseconds
+    :rtype: dict
+    """
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        p = make_farm(Path(tmp_dir), size, record_lines, scripts)
+        args = argparse.Namespace(yes=True, verbose=False)
+        packages = p._venvs_list()[:sample]
+
+        results = {
+            "freeze_cold_ms": timed(p.freeze, args),
+            "freeze_warm_ms": timed(p.freeze, args),
+        }
+        # the farm venvs have no pip
+        sync_file = Path(tmp_dir, "tools.txt")
+        sync_file.write_text(
+            "".join(f"{package}==1.0.0 --no-pip\n" for package in p._venvs_list())
+        )
+        args.file = str(sync_file)
+        results["sync_noop_ms"] = timed(p.sync, args)
+        elapsed = sum(timed(p._package_scripts, package) for package in packages)
+        results["package_scripts_ms"] = elapsed / len(packages)
+        elapsed = sum(timed(p._create_link, package, True) for package in packages)
+        results["create_link_ms"] = elapsed / len(packages)
+        args.script = packages[0]
+        results["which_ms"] = timed(p.which, args)
+        elapsed = 0
+        for package in packages:
+            args.package = package
+            elapsed += timed(p.uninstall, args)
+        results["uninstall_ms"] = elapsed / len(packages)
+
+    return {name: round(value, 3) for name, value in results.items()}
+
+
+def git_revision() -> str:
+    """Get the current git revision of the repository, if any."""
+
+    try:
+        revision = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=str(Path(__file__).parent),
+            stderr=subprocess.DEVNULL,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+    return revision.decode("utf-8").strip()
+
+
+def compare(results: dict, previous: dict):
+    """Print the ratio between current and previous results.
+
+    :param results: Current results
+    :type results: dict
+    :param previous: Previous results
+    :type previous: dict
+    """
+
+    print(f"{previous['revision'] or 'previous'} -> {results['revision'] or 'current'}")
+    for size, timings in results["sizes"].items():
+        for name, value in timings.items():
+            before = previous["sizes"].get(size, {}).get(name)
+            if before:
+                print(
+                    f"  N={size:>6} {name:<20} {before:>10.3f} -> {value:>10.3f}"
+                    f" ({value / before:.2f}x)"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1000, 10000],
+        help="numbers of venvs",
+    )
+    parser.add_argument(
+        "--record-lines", type=int, default=200, help="files listed in each RECORD"
+    )
+    parser.add_argument("--scripts", type=int, default=2, help="scripts per venv")
+    parser.add_argument(
+        "--sample",
+        type=int,
+        default=100,
+        help="venvs used by per-package operations",
+    )
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--compare", help="compare with a previous JSON results file")
+    args = parser.parse_args()
+
+    results = {
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "cpus": os.cpu_count(),
+        "record_lines": args.record_lines,
+        "scripts": args.scripts,
+        "sample": args.sample,
+        "sizes": {
+            str(size): bench(size, args.record_lines, args.scripts, args.sample)
+            for size in args.sizes
+        },
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    print(output)
+
+    if args.compare:
+        compare(results, json.loads(Path(args.compare).read_text()))
+
+
+if __name__ == "__main__":
+    main()
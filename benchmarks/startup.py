@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Measure pipis startup time of each command with `python -X importtime`.
+
+Each command is run several times in a fresh interpreter, against empty
+`PIPIS_VENVS` and `PIPIS_BIN` directories. Results are printed as JSON, and the
+script fails if a command imports modules for longer than `--max-ms`.
+
+    python benchmarks/startup.py --runs 10 --output startup.json --max-ms 50
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+COMMANDS = [
+    ["-h"],
+    ["version"],
+    ["freeze"],
+    ["cache"],
+    ["install", "-h"],
+    ["update", "-h"],
+    ["uninstall", "-h"],
+]
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Parse `-X importtime` output.
+
+    :param stderr: Interpreter error output
+    :type stderr: str
+    :return: Cumulative import time in microseconds by module name
+    :rtype: dict
+    """
+
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line.split(":", 1)[1].split("|")
+        # nested imports are indented below their parent
+        modules[name[1:].rstrip()] = int(cumulative)
+
+    return modules
+
+
+def run(command: list, env: dict) -> tuple:
+    """Run a pipis command once.
+
+    :param command: Command arguments
+    :type command: list
+    :param env: Environment variables
+    :type env: dict
+    :return: Wall time in milliseconds and cumulative import times
+    :rtype: tuple
+    """
+
+    cmd = [sys.executable, "-X", "importtime", "-m", "pipis"] + command
+    start = time.perf_counter()
+    proc = subprocess.run(
+        cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True
+    )
+    wall = (time.perf_counter() - start) * 1000
+
+    return wall, parse_importtime(proc.stderr.decode("utf-8"))
+
+
+def bench(runs: int) -> dict:
+    """Benchmark every command.
+
+    :param runs: Number of runs per command
+    :type runs: int
+    :return: Results by command
+    :rtype: dict
+    """
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = dict(os.environ)
+        env["PIPIS_VENVS"] = str(Path(tmp_dir, "venvs"))
+        env["PIPIS_BIN"] = str(Path(tmp_dir, "bin"))
+        for command in COMMANDS:
+            walls, imports = [], []
+            for _ in range(runs):
+                wall, modules = run(command, env)
+                walls.append(wall)
+                # top-level imports are not indented
+                imports.append(
+                    sum(t for n, t in modules.items() if not n.startswith(" "))
+                )
+            heaviest = sorted(modules.items(), key=lambda m: m[1], reverse=True)
+            results[" ".join(command)] = {
+                "wall_ms": round(statistics.median(walls), 2),
+                "import_ms": round(statistics.median(imports) / 1000, 2),
+                "modules": len(modules),
+                "heaviest": [
+                    {"module": n.strip(), "cumulative_ms": round(t / 1000, 2)}
+                    for n, t in heaviest[:10]
+                ],
+            }
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="runs per command")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument(
+        "--max-ms", type=float, help="fail if a command imports for longer"
+    )
+    args = parser.parse_args()
+
+    results = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "commands": bench(args.runs),
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    print(output)
+
+    if args.max_ms is not None:
+        slow = [
+            command
+            for command, result in results["commands"].items()
+            if result["import_ms"] > args.max_ms
+        ]
+        for command in slow:
+            print(f"'pipis {command}' startup is over {args.max_ms}ms", file=sys.stderr)
+        return 1 if slow else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,8 @@
 """'pipis' stands for 'pip isolated'"""
 
-import pkg_resources
+import sys
 
+from pipis.metadata import find_distribution
 
-__version__ = pkg_resources.get_distribution("pipis").version
+
+__version__ = find_distribution(sys.path, "pipis").version
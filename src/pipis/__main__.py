@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import argparse
+import sys
 
 from pipis.utils import Pipis
 
@@ -8,12 +9,47 @@ from pipis.utils import Pipis
 def main():
     parser = argparse.ArgumentParser(prog="pipis", description=Pipis.__doc__)
     subparsers = parser.add_subparsers(title="available commands", dest="command")
+    # configuration is loaded lazily, only by the commands using it
     commands = Pipis()
 
     # globals arguments
     parser.add_argument(
         "-v", "--verbose", action="store_true", help="enable verbose ouput"
     )
+    parser.add_argument(
+        "--lock-timeout",
+        help="seconds to wait for a package locked by another pipis process,"
+        " 0 to fail immediately (default: wait)",
+        metavar="seconds",
+        action="store",
+        type=float,
+    )
+    parser.add_argument(
+        "--timeout",
+        help="seconds before killing a pip subprocess (default: never)",
+        metavar="seconds",
+        action="store",
+        type=float,
+    )
+    parser.add_argument(
+        "--log",
+        help="append pip subprocesses output to a JSON lines file",
+        metavar="file",
+        action="store",
+        type=str,
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="show time, subprocesses and written bytes of each phase",
+    )
+    parser.add_argument(
+        "--trace",
+        help="write phases timings to a Chrome trace file",
+        metavar="file",
+        action="store",
+        type=str,
+    )
 
     # version command and arguments
     parser_version = subparsers.add_parser(
@@ -23,17 +59,63 @@ def main():
 
     # freeze command and arguments
     parser_freeze = subparsers.add_parser("freeze", help=commands.freeze.__doc__)
+    parser_freeze.add_argument(
+        "--format",
+        help="output format (default: requirements)",
+        choices=["requirements", "json", "jsonl"],
+        default="requirements",
+    )
+    parser_freeze.add_argument(
+        "-j",
+        "--jobs",
+        help="number of stale venvs inspected concurrently (default: 1)",
+        metavar="N",
+        action="store",
+        type=int,
+        default=1,
+    )
     parser_freeze.set_defaults(func=commands.freeze)
 
     # search command and arguments
     parser_search = subparsers.add_parser("search", help=commands.search.__doc__)
-    parser_search.add_argument("query", help="query name", action="store", type=str)
+    parser_search.add_argument(
+        "query", help="query name", action="store", type=str, nargs="?"
+    )
+    parser_search.add_argument(
+        "--refresh",
+        help="refresh the local index snapshot before searching",
+        action="store_true",
+    )
+    parser_search.add_argument(
+        "--index",
+        help="index URL, local mirror directory or JSON dump to refresh from",
+        metavar="source",
+        action="store",
+        type=str,
+    )
     parser_search.set_defaults(func=commands.search)
 
     # install command and arguments
     parser_install = subparsers.add_parser("install", help=commands.install.__doc__)
     parser_install.add_argument(
-        "package", help="package name", action="store", type=str
+        "package", help="package name", action="store", type=str, nargs="*"
+    )
+    parser_install.add_argument(
+        "-r",
+        "--requirement",
+        help="install packages listed in the given requirements file",
+        metavar="file",
+        action="store",
+        type=str,
+    )
+    parser_install.add_argument(
+        "-j",
+        "--jobs",
+        help="number of packages installed concurrently (default: 4)",
+        metavar="N",
+        action="store",
+        type=int,
+        default=4,
     )
     parser_install.add_argument(
         "-y", "--yes", action="store_true", help="do not prompt for confirmation"
@@ -41,9 +123,10 @@ def main():
     parser_install.add_argument(
         "-d",
         "--dependency",
-        help="add the specified package as dependency of the main package",
+        help="add the specified package as dependency of the main package, may be "
+        "repeated",
         metavar="package",
-        action="store",
+        action="append",
         type=str,
     )
     parser_install.add_argument(
@@ -52,6 +135,11 @@ def main():
         help="give the virtual environment access to the system site-packages dir",
         action="store_true",
     )
+    parser_install.add_argument(
+        "--no-pip",
+        help="do not install pip into the virtual environment, use pipis' pip",
+        action="store_true",
+    )
     parser_install.add_argument(
         "-U",
         "--upgrade",
@@ -64,16 +152,119 @@ def main():
         help="ignore the installed packages (reinstalling instead)",
         action="store_true",
     )
+    parser_install.add_argument(
+        "--lock",
+        help="install the versions pinned in a lock file, without resolving them",
+        metavar="file",
+        action="store",
+        type=str,
+    )
+    parser_install.add_argument(
+        "-O",
+        "--optimize",
+        help="compile the bytecode at this optimization level, may be repeated "
+        "(default: 0)",
+        metavar="level",
+        action="append",
+        type=int,
+        choices=[0, 1, 2],
+    )
+    parser_install.add_argument(
+        "--launchers",
+        help="replace the package scripts by minimal launchers of its entry points",
+        action="store_true",
+    )
+    parser_install.add_argument(
+        "--layer",
+        help="share this dependency with the packages installed with the same "
+        "layer, may be repeated",
+        metavar="requirement",
+        action="append",
+    )
+    parser_install.add_argument(
+        "--dedupe",
+        help="hardlink files identical to other venvs after install",
+        action="store_true",
+    )
     parser_install.set_defaults(func=commands.install)
 
     # update command and arguments
     parser_update = subparsers.add_parser("update", help=commands.update.__doc__)
-    parser_update.add_argument("package", help="package name", action="store", type=str)
+    parser_update.add_argument(
+        "package", help="package name", action="store", type=str, nargs="*"
+    )
     parser_update.add_argument(
         "-y", "--yes", action="store_true", help="do not prompt for confirmation"
     )
+    parser_update.add_argument(
+        "-a",
+        "--all",
+        help="update all outdated packages",
+        action="store_true",
+    )
+    parser_update.add_argument(
+        "-j",
+        "--jobs",
+        help="number of packages updated concurrently (default: 4)",
+        metavar="N",
+        action="store",
+        type=int,
+        default=4,
+    )
+    parser_update.add_argument(
+        "-O",
+        "--optimize",
+        help="compile the bytecode at this optimization level, may be repeated "
+        "(default: 0)",
+        metavar="level",
+        action="append",
+        type=int,
+        choices=[0, 1, 2],
+    )
+    parser_update.add_argument(
+        "--launchers",
+        help="replace the package scripts by minimal launchers of its entry points",
+        action="store_true",
+    )
+    parser_update.add_argument(
+        "--dedupe",
+        help="hardlink files identical to other venvs after update",
+        action="store_true",
+    )
     parser_update.set_defaults(func=commands.update)
 
+    # sync command and arguments
+    parser_sync = subparsers.add_parser("sync", help=commands.sync.__doc__)
+    parser_sync.add_argument(
+        "file",
+        help="desired state file, in freeze format with optional install options",
+        action="store",
+        type=str,
+    )
+    parser_sync.add_argument(
+        "-y", "--yes", action="store_true", help="do not prompt for confirmation"
+    )
+    parser_sync.add_argument(
+        "-j",
+        "--jobs",
+        help="number of packages processed concurrently (default: 4)",
+        metavar="N",
+        action="store",
+        type=int,
+        default=4,
+    )
+    parser_sync.add_argument(
+        "--keep",
+        action="store_true",
+        help="do not uninstall packages missing from the file",
+    )
+    parser_sync.add_argument(
+        "--dedupe",
+        help="hardlink files identical to other venvs after install",
+        action="store_true",
+    )
+    parser_sync.set_defaults(func=commands.sync)
+
     # uninstall command and arguments
     parser_uninstall = subparsers.add_parser(
         "uninstall", help=commands.uninstall.__doc__
@@ -86,9 +277,130 @@ def main():
     )
     parser_uninstall.set_defaults(func=commands.uninstall)
 
+    # rollback command and arguments
+    parser_rollback = subparsers.add_parser("rollback", help=commands.rollback.__doc__)
+    parser_rollback.add_argument(
+        "package", help="package name", action="store", type=str
+    )
+    parser_rollback.add_argument(
+        "-y", "--yes", action="store_true", help="do not prompt for confirmation"
+    )
+    parser_rollback.set_defaults(func=commands.rollback)
+
+    # which command and arguments
+    parser_which = subparsers.add_parser("which", help=commands.which.__doc__)
+    parser_which.add_argument("script", help="script name", action="store", type=str)
+    parser_which.set_defaults(func=commands.which)
+
+    # compile command and arguments
+    parser_compile = subparsers.add_parser("compile", help=commands.compile.__doc__)
+    parser_compile.add_argument(
+        "package", help="package name", action="store", type=str, nargs="*"
+    )
+    parser_compile.add_argument(
+        "-a",
+        "--all",
+        help="compile all packages",
+        action="store_true",
+    )
+    parser_compile.add_argument(
+        "-O",
+        "--optimize",
+        help="compile the bytecode at this optimization level, may be repeated "
+        "(default: 0)",
+        metavar="level",
+        action="append",
+        type=int,
+        choices=[0, 1, 2],
+    )
+    parser_compile.set_defaults(func=commands.compile)
+
+    # dedupe command and arguments
+    parser_dedupe = subparsers.add_parser("dedupe", help=commands.dedupe.__doc__)
+    parser_dedupe.add_argument(
+        "package",
+        help="package name (default: all packages)",
+        action="store",
+        type=str,
+        nargs="*",
+    )
+    parser_dedupe.add_argument(
+        "-j",
+        "--jobs",
+        help="number of venvs processed concurrently (default: 4)",
+        metavar="N",
+        action="store",
+        type=int,
+        default=4,
+    )
+    parser_dedupe.set_defaults(func=commands.dedupe)
+
+    # cache command and arguments
+    parser_cache = subparsers.add_parser("cache", help=commands.cache.__doc__)
+    parser_cache.add_argument(
+        "action",
+        help="show cache summary (default), list cached wheels or prune the cache",
+        action="store",
+        choices=["info", "list", "prune"],
+        nargs="?",
+        default="info",
+    )
+    parser_cache.add_argument(
+        "--max-size",
+        help="size to which the cache is pruned, ex: 500M (default: 0)",
+        metavar="size",
+        action="store",
+        type=str,
+        default="0",
+    )
+    parser_cache.set_defaults(func=commands.cache)
+
+    # bundle command and arguments
+    parser_bundle = subparsers.add_parser("bundle", help=commands.bundle.__doc__)
+    parser_bundle.add_argument(
+        "action",
+        help="export the installed packages to a bundle, or restore them from it",
+        action="store",
+        choices=["export", "restore"],
+    )
+    parser_bundle.add_argument("file", help="bundle file", action="store", type=str)
+    parser_bundle.add_argument(
+        "-y", "--yes", action="store_true", help="do not prompt for confirmation"
+    )
+    parser_bundle.add_argument(
+        "-j",
+        "--jobs",
+        help="number of packages processed concurrently (default: 4)",
+        metavar="N",
+        action="store",
+        type=int,
+        default=4,
+    )
+    parser_bundle.set_defaults(func=commands.bundle)
+
     # parse and run
     args = parser.parse_args()
-    args.func(args)
+    if not args.command:
+        parser.print_help()
+        return
+    commands.lock_timeout = args.lock_timeout
+    commands.timeout = args.timeout
+    if args.log:
+        commands.log = open(args.log, "a")
+    if args.timings or args.trace:
+        from pipis.trace import Tracer
+
+        commands.tracer = Tracer()
+    try:
+        with commands._phase(args.command):
+            args.func(args)
+    finally:
+        if args.timings:
+            print(commands.tracer.summary(), file=sys.stderr)
+        if args.trace:
+            commands.tracer.write_trace(args.trace)
+        if commands.log is not None:
+            commands.log.close()
 
 
 if __name__ == "__main__":
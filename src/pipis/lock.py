@@ -0,0 +1,99 @@
+"""advisory file locks shared by concurrent pipis processes"""
+
+from contextlib import contextmanager
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+    import msvcrt
+
+POLL_INTERVAL = 0.05
+
+
+class LockTimeout(Exception):
+    """Raised when a lock is still held by another process after the timeout."""
+
+
+def _try_lock(fd: int, shared: bool = False) -> bool:
+    """Try to lock a file without blocking.
+
+    :param fd: Lock file descriptor
+    :type fd: int
+    :param shared: Take a shared lock instead of an exclusive one, defaults to
+        False
+    :type shared: bool, optional
+    :return: Wether the lock was acquired or not
+    :rtype: bool
+    """
+
+    try:
+        if fcntl is not None:
+            mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+            fcntl.flock(fd, mode | fcntl.LOCK_NB)
+        else:  # pragma: no cover
+            # msvcrt has no shared locks, they are exclusive
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+
+    return True
+
+
+def _unlock(fd: int):
+    """Unlock a file locked by `_try_lock`.
+
+    :param fd: Lock file descriptor
+    :type fd: int
+    """
+
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:  # pragma: no cover
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(
+    path: str, timeout: float = None, description: str = None, shared: bool = False
+):
+    """Hold an exclusive, or shared, advisory lock on a file.
+
+    Locks are held by open file, so they also exclude threads of the same
+    process, and they are released by the system if the process dies. Lock
+    files are never removed: removing them would let two processes lock two
+    different files of the same path.
+
+    :param path: Lock file path
+    :type path: str
+    :param timeout: Seconds to wait for the lock, forever when None, defaults
+        to None
+    :type timeout: float, optional
+    :param description: Locked resource, used in the error message, defaults to
+        the lock file path
+    :type description: str, optional
+    :param shared: Allow other shared locks, only excluding exclusive ones,
+        defaults to False
+    :type shared: bool, optional
+    :raises LockTimeout: When the lock is not acquired before the timeout
+    """
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not _try_lock(fd, shared):
+            if deadline is not None and time.monotonic() >= deadline:
+                raise LockTimeout(
+                    f"{description or path} is locked by another pipis process"
+                )
+            time.sleep(POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            _unlock(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,222 @@
+"""metadata reader for packages installed in pipis venvs"""
+
+import os
+from pathlib import Path
+import re
+
+
+class DistributionNotFound(Exception):
+    """Raised when a package has no metadata in the given site-packages dirs."""
+
+
+def safe_name(name: str) -> str:
+    """Normalize a project name as described in PEP 503.
+
+    :param name: Project name
+    :type name: str
+    :return: Normalized project name
+    :rtype: str
+    """
+
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+class Distribution:
+    """Metadata of an installed package, read lazily from its `.dist-info` or
+    `.egg-info` directory.
+
+    Only the subset of `pkg_resources.Distribution` used by pipis is implemented.
+    """
+
+    def __init__(self, location: str, path: str):
+        self.location = location
+        self.egg_info = path
+        self._headers = None
+
+    def __repr__(self) -> str:
+        return f"<Distribution {self.egg_info!r}>"
+
+    def _read_headers(self) -> dict:
+        """Read the headers of the METADATA or PKG-INFO file.
+
+        Only the headers block is parsed, the long description is never read.
+
+        :return: Metadata headers
+        :rtype: dict
+        """
+
+        if self._headers is None:
+            self._headers = {}
+            for name in ("METADATA", "PKG-INFO"):
+                if not self.has_metadata(name):
+                    continue
+                with open(self._metadata_path(name), encoding="utf-8") as f:
+                    for line in f:
+                        if not line.strip():
+                            break
+                        key, sep, value = line.partition(":")
+                        if sep and not key.startswith((" ", "\t")):
+                            self._headers.setdefault(key.lower(), value.strip())
+                break
+
+        return self._headers
+
+    def _metadata_path(self, name: str) -> str:
+        """Get the path of a metadata file.
+
+        :param name: Metadata file name
+        :type name: str
+        :return: Metadata file path
+        :rtype: str
+        """
+
+        # single file egg-info only holds PKG-INFO
+        if os.path.isfile(self.egg_info):
+            return self.egg_info if name == "PKG-INFO" else ""
+
+        return os.path.join(self.egg_info, name)
+
+    @property
+    def project_name(self) -> str:
+        """Project name, as declared in the metadata."""
+
+        name = self._read_headers().get("name")
+        if not name:
+            name = Path(self.egg_info).stem.split("-")[0]
+
+        return name
+
+    @property
+    def version(self) -> str:
+        """Project version, from the directory name or from the metadata."""
+
+        parts = Path(self.egg_info).stem.split("-")
+        if len(parts) > 1:
+            return parts[1]
+
+        return self._read_headers().get("version", "")
+
+    def has_metadata(self, name: str) -> bool:
+        """Return wether a metadata file exists or not.
+
+        :param name: Metadata file name
+        :type name: str
+        :return: Metadata file existence
+        :rtype: bool
+        """
+
+        path = self._metadata_path(name)
+
+        return bool(path) and os.path.isfile(path)
+
+    def get_metadata(self, name: str) -> str:
+        """Get the content of a metadata file.
+
+        :param name: Metadata file name
+        :type name: str
+        :return: Metadata file content
+        :rtype: str
+        """
+
+        return Path(self._metadata_path(name)).read_text(encoding="utf-8")
+
+    def get_metadata_lines(self, name: str):
+        """Yield the non-blank, non-comment lines of a metadata file.
+
+        :param name: Metadata file name
+        :type name: str
+        """
+
+        with open(self._metadata_path(name), encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    yield line
+
+    def requires(self) -> list:
+        """Get the requirements declared in the metadata, with their markers.
+
+        Sections of an egg-info `requires.txt` are turned into markers, as in the
+        `Requires-Dist` headers of a dist-info.
+
+        :return: Requirements
+        :rtype: list
+        """
+
+        requires = []
+        if self.has_metadata("METADATA"):
+            with open(self._metadata_path("METADATA"), encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        break
+                    key, sep, value = line.partition(":")
+                    if sep and key.lower() == "requires-dist":
+                        requires.append(value.strip())
+        elif self.has_metadata("requires.txt"):
+            marker = ""
+            for line in self.get_metadata_lines("requires.txt"):
+                if line.startswith("["):
+                    extra, _, condition = line.strip("[]").partition(":")
+                    markers = [f"({condition})"] if condition else []
+                    markers += [f'extra == "{extra}"'] if extra else []
+                    marker = f"; {' and '.join(markers)}"
+                    continue
+                requires.append(line + marker)
+
+        return requires
+
+    def get_entry_map(self, group: str = None) -> dict:
+        """Get entry points declared in entry_points.txt.
+
+        :param group: Entry points group, defaults to None
+        :type group: str, optional
+        :return: Entry points by group, or entry points of the given group
+        :rtype: dict
+        """
+
+        entry_map = {}
+        if self.has_metadata("entry_points.txt"):
+            from configparser import ConfigParser
+
+            parser = ConfigParser(delimiters=("=",), interpolation=None)
+            parser.optionxform = str
+            parser.read_string(self.get_metadata("entry_points.txt"))
+            entry_map = {
+                section: dict(parser.items(section)) for section in parser.sections()
+            }
+
+        if group is not None:
+            return entry_map.get(group, {})
+
+        return entry_map
+
+
+def find_distribution(paths: list, package: str) -> Distribution:
+    """Find the metadata of a package in the given site-packages dirs.
+
+    Only the listed directories are scanned, `sys.path` is left untouched.
+
+    :param paths: Site-packages paths
+    :type paths: list
+    :param package: Package name
+    :type package: str
+    :raises DistributionNotFound: When no metadata is found for the package
+    :return: Package dist object
+    :rtype: Distribution
+    """
+
+    key = safe_name(package)
+    for location in paths:
+        try:
+            entries = list(os.scandir(location))
+        except OSError:
+            # missing directory or zip file
+            continue
+        for entry in entries:
+            stem, ext = os.path.splitext(entry.name)
+            if ext not in (".dist-info", ".egg-info"):
+                continue
+            if safe_name(stem.split("-")[0]) == key:
+                return Distribution(location, entry.path)
+
+    raise DistributionNotFound(f"The '{package}' distribution was not found")
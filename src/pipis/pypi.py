@@ -0,0 +1,198 @@
+"""client for PEP 503 / PEP 691 simple package indexes"""
+
+import json
+import os
+import re
+
+from pipis.metadata import safe_name
+
+DEFAULT_INDEX_URL = "https://pypi.org/simple"
+SDIST_EXTENSIONS = (".tar.gz", ".tar.bz2", ".tar.xz", ".tgz", ".zip")
+
+
+def index_url() -> str:
+    """Get the simple index URL, pip's `PIP_INDEX_URL` is honored.
+
+    :return: Index URL
+    :rtype: str
+    """
+
+    return os.getenv("PIP_INDEX_URL", DEFAULT_INDEX_URL).rstrip("/")
+
+
+def filename_version(filename: str) -> str:
+    """Get the version of a wheel or sdist file name.
+
+    :param filename: Distribution file name
+    :type filename: str
+    :return: Version, or an empty string for unsupported files
+    :rtype: str
+    """
+
+    if filename.endswith(".whl"):
+        return filename.split("-")[1]
+    for extension in SDIST_EXTENSIONS:
+        if filename.endswith(extension):
+            return filename[: -len(extension)].rpartition("-")[2]
+
+    return ""
+
+
+def project_files(project: str, url: str = None) -> list:
+    """Get the non-yanked distribution file names of a project.
+
+    :param project: Project name
+    :type project: str
+    :param url: Index URL, defaults to `index_url()`
+    :type url: str, optional
+    :return: File names
+    :rtype: list
+    """
+
+    from urllib.request import Request, urlopen
+
+    url = f"{url or index_url()}/{safe_name(project)}/"
+    request = Request(
+        url,
+        headers={"Accept": "application/vnd.pypi.simple.v1+json, text/html;q=0.1"},
+    )
+    with urlopen(request, timeout=30) as response:  # nosec
+        content_type = response.headers.get("Content-Type", "")
+        content = response.read().decode("utf-8")
+
+    if "json" in content_type:
+        files = [
+            f["filename"] for f in json.loads(content)["files"] if not f.get("yanked")
+        ]
+    else:
+        files = [
+            filename
+            for attrs, filename in re.findall(r"<a([^>]*)>([^<]+)</a>", content)
+            if "data-yanked" not in attrs
+        ]
+
+    return files
+
+
+def latest_version(project: str, url: str = None) -> str:
+    """Get the latest final release of a project.
+
+    :param project: Project name
+    :type project: str
+    :param url: Index URL, defaults to `index_url()`
+    :type url: str, optional
+    :return: Version, or an empty string when there is no release
+    :rtype: str
+    """
+
+    import pkg_resources
+
+    versions = []
+    for filename in project_files(project, url):
+        version = filename_version(filename)
+        if not version:
+            continue
+        try:
+            version = pkg_resources.parse_version(version)
+        except ValueError:
+            # InvalidVersion, recent pkg_resources no longer parse legacy versions
+            continue
+        if not version.is_prerelease:
+            versions.append(version)
+
+    return str(max(versions)) if versions else ""
+
+
+def _dump_projects(data) -> dict:
+    """Get the projects of a JSON dump.
+
+    PEP 691 index pages are supported, projects may have a "summary" key.
+    Lists of projects and mappings of names to summaries are supported too.
+
+    :param data: JSON dump content
+    :type data: dict or list
+    :return: Summaries by project name
+    :rtype: dict
+    """
+
+    if isinstance(data, dict) and "projects" in data:
+        data = data["projects"]
+    if isinstance(data, dict):
+        return {name: summary or "" for name, summary in data.items()}
+
+    return {p["name"]: p.get("summary") or "" for p in data}
+
+
+def _mirror_projects(path: str) -> dict:
+    """Get the projects of a local mirror directory.
+
+    PEP 503 trees (one directory by project, optionally below `simple/`) and
+    flat directories of distribution files (as used by `--find-links`) are
+    supported.
+
+    :param path: Mirror directory path
+    :type path: str
+    :return: Summaries by project name, all empty
+    :rtype: dict
+    """
+
+    if os.path.isdir(os.path.join(path, "simple")):
+        path = os.path.join(path, "simple")
+
+    projects = {}
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                projects[entry.name] = ""
+            elif filename_version(entry.name):
+                name = entry.name.split("-")[0]
+                if not entry.name.endswith(".whl"):
+                    name = entry.name.rpartition("-")[0]
+                projects[name] = ""
+
+    return projects
+
+
+def project_list(source: str = None, etag: str = None) -> tuple:
+    """Get all the projects of an index.
+
+    :param source: Index URL, local mirror directory or JSON dump file,
+        defaults to `index_url()`
+    :type source: str, optional
+    :param etag: ETag of the previous response of the index, defaults to None
+    :type etag: str, optional
+    :return: Summaries by project name, or None when the index did not change
+        since `etag`, and the ETag of the response
+    :rtype: tuple
+    """
+
+    source = source or index_url()
+    if os.path.isdir(source):
+        return _mirror_projects(source), None
+    if os.path.isfile(source):
+        with open(source, encoding="utf-8") as f:
+            return _dump_projects(json.load(f)), None
+
+    from urllib.error import HTTPError
+    from urllib.request import Request, urlopen
+
+    headers = {"Accept": "application/vnd.pypi.simple.v1+json, text/html;q=0.1"}
+    if etag:
+        headers["If-None-Match"] = etag
+    request = Request(f"{source.rstrip('/')}/", headers=headers)
+    try:
+        with urlopen(request, timeout=300) as response:  # nosec
+            etag = response.headers.get("ETag")
+            content_type = response.headers.get("Content-Type", "")
+            content = response.read().decode("utf-8")
+    except HTTPError as err:
+        if err.code == 304:
+            return None, etag
+        raise
+
+    if "json" in content_type:
+        projects = _dump_projects(json.loads(content))
+    else:
+        projects = {name: "" for name in re.findall(r"<a[^>]*>([^<]+)</a>", content)}
+
+    return projects, etag
@@ -0,0 +1,205 @@
+"""asyncio runner of subprocesses, streaming their output line by line"""
+
+import asyncio
+import subprocess
+import sys
+import threading
+
+# longest output line read at once, pip may print long lines of requirements
+LINE_LIMIT = 1024 * 1024
+
+
+async def _read_lines(stream, name: str, on_line, lines: list = None):
+    """Read a subprocess output stream line by line.
+
+    :param stream: Output stream
+    :type stream: asyncio.StreamReader
+    :param name: Stream name, "stdout" or "stderr"
+    :type name: str
+    :param on_line: Function called with the stream name and each decoded line
+    :type on_line: callable
+    :param lines: List collecting the raw lines instead of calling `on_line`,
+        defaults to None
+    :type lines: list, optional
+    """
+
+    while True:
+        line = await stream.readline()
+        if not line:
+            break
+        if lines is not None:
+            lines.append(line)
+        elif on_line is not None:
+            on_line(name, line.decode("utf-8", "replace").rstrip("\r\n"))
+
+
+async def _kill(proc):
+    """Kill a subprocess, if still running, and reap it.
+
+    :param proc: Subprocess
+    :type proc: asyncio.subprocess.Process
+    """
+
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+
+
+async def run_async(
+    cmd: list, on_line=None, timeout: float = None, capture: bool = False
+) -> bytes:
+    """Run a command, streaming its output lines.
+
+    The subprocess is killed when the timeout expires or when the calling task
+    is cancelled.
+
+    :param cmd: Command
+    :type cmd: list
+    :param on_line: Function called with the stream name and each line of the
+        output, defaults to None
+    :type on_line: callable, optional
+    :param timeout: Seconds before killing the subprocess, defaults to None
+    :type timeout: float, optional
+    :param capture: Return stdout instead of streaming it, defaults to False
+    :type capture: bool, optional
+    :raises subprocess.CalledProcessError: When the command fails
+    :raises subprocess.TimeoutExpired: When the command is killed after timeout
+    :return: Command standard output, if captured
+    :rtype: bytes
+    """
+
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        limit=LINE_LIMIT,
+    )
+    stdout = [] if capture else None
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(
+                _read_lines(proc.stdout, "stdout", on_line, stdout),
+                _read_lines(proc.stderr, "stderr", on_line),
+                proc.wait(),
+            ),
+            timeout,
+        )
+    except asyncio.TimeoutError:
+        await _kill(proc)
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    except asyncio.CancelledError:
+        await _kill(proc)
+        raise
+
+    output = b"".join(stdout) if capture else None
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, output)
+
+    return output
+
+
+def _run_threaded(
+    cmd: list, on_line=None, timeout: float = None, capture: bool = False
+) -> bytes:
+    """Run a command with a thread reading each output stream, see `run`.
+
+    Before Python 3.8 asyncio subprocesses need a child watcher attached to the
+    loop of the main thread, they cannot be run from new loops or thread pools.
+
+    :param cmd: Command
+    :type cmd: list
+    :param on_line: Function called with the stream name and each line of the
+        output, defaults to None
+    :type on_line: callable, optional
+    :param timeout: Seconds before killing the subprocess, defaults to None
+    :type timeout: float, optional
+    :param capture: Return stdout instead of streaming it, defaults to False
+    :type capture: bool, optional
+    :raises subprocess.CalledProcessError: When the command fails
+    :raises subprocess.TimeoutExpired: When the command is killed after timeout
+    :return: Command standard output, if captured
+    :rtype: bytes
+    """
+
+    # lines are handled one at a time, as they are by the event loop
+    line_lock = threading.Lock()
+
+    def read_lines(stream, name, lines=None):
+        for line in iter(stream.readline, b""):
+            if lines is not None:
+                lines.append(line)
+            elif on_line is not None:
+                with line_lock:
+                    on_line(name, line.decode("utf-8", "replace").rstrip("\r\n"))
+        stream.close()
+
+    proc = subprocess.Popen(
+        cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    stdout = [] if capture else None
+    readers = [
+        threading.Thread(target=read_lines, args=(proc.stdout, "stdout", stdout)),
+        threading.Thread(target=read_lines, args=(proc.stderr, "stderr")),
+    ]
+    for reader in readers:
+        reader.daemon = True
+        reader.start()
+    try:
+        proc.wait(timeout)
+    except (subprocess.TimeoutExpired, KeyboardInterrupt):
+        proc.kill()
+        proc.wait()
+        raise
+    finally:
+        for reader in readers:
+            reader.join()
+
+    output = b"".join(stdout) if capture else None
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, output)
+
+    return output
+
+
+def run(cmd: list, on_line=None, timeout: float = None, capture: bool = False):
+    """Run a command in a new event loop, see `run_async`.
+
+    Each thread can run its own loop, so commands can also be run concurrently
+    from a thread pool. On KeyboardInterrupt the subprocess is killed. Before
+    Python 3.8 the output is read by threads instead, see `_run_threaded`.
+
+    :param cmd: Command
+    :type cmd: list
+    :param on_line: Function called with the stream name and each line of the
+        output, defaults to None
+    :type on_line: callable, optional
+    :param timeout: Seconds before killing the subprocess, defaults to None
+    :type timeout: float, optional
+    :param capture: Return stdout instead of streaming it, defaults to False
+    :type capture: bool, optional
+    :raises subprocess.CalledProcessError: When the command fails
+    :raises subprocess.TimeoutExpired: When the command is killed after timeout
+    :return: Command standard output, if captured
+    :rtype: bytes
+    """
+
+    if sys.version_info < (3, 8):
+        return _run_threaded(cmd, on_line, timeout, capture)
+
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(run_async(cmd, on_line, timeout, capture))
+    try:
+        return loop.run_until_complete(task)
+    except KeyboardInterrupt:
+        task.cancel()
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        raise
+    finally:
+        loop.close()
@@ -0,0 +1,153 @@
+"""timing instrumentation of pipis phases"""
+
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+
+class NullPhase:
+    """Phase context used when tracing is disabled, it does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_PHASE = NullPhase()
+
+
+def written_bytes() -> int:
+    """Get the bytes written by the current process and its reaped children.
+
+    :return: Written bytes, or 0 when the platform does not account them
+    :rtype: int
+    """
+
+    try:
+        with open(f"/proc/{os.getpid()}/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+
+    return 0
+
+
+class Tracer:
+    """Record wall time, subprocess count and written bytes of phases.
+
+    Subprocesses are counted per thread. Written bytes are accounted for the
+    whole process, so they include the work of concurrent phases.
+    """
+
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter()
+
+    def count_subprocess(self):
+        """Count a subprocess started by the current thread."""
+
+        self._local.subprocesses = getattr(self._local, "subprocesses", 0) + 1
+
+    @contextmanager
+    def phase(self, name: str, **args: dict):
+        """Record a phase.
+
+        :param name: Phase name
+        :type name: str
+        :param args: Phase details, like the package name
+        :type args: dict
+        """
+
+        subprocesses = getattr(self._local, "subprocesses", 0)
+        written = written_bytes()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            event = {
+                "name": name,
+                "tid": threading.get_ident(),
+                "start": start - self._origin,
+                "duration": end - start,
+                "subprocesses": getattr(self._local, "subprocesses", 0) - subprocesses,
+                "written": written_bytes() - written,
+                "args": {k: v for k, v in args.items() if v is not None},
+            }
+            with self._lock:
+                self.events.append(event)
+
+    def summary(self) -> str:
+        """Summarize phases, aggregated by name.
+
+        :return: Human readable summary
+        :rtype: str
+        """
+
+        phases = {}
+        for event in self.events:
+            phase = phases.setdefault(
+                event["name"],
+                {"count": 0, "duration": 0.0, "subprocesses": 0, "written": 0},
+            )
+            phase["count"] += 1
+            phase["duration"] += event["duration"]
+            phase["subprocesses"] += event["subprocesses"]
+            phase["written"] += event["written"]
+
+        lines = [
+            f"{'phase':<24} {'count':>6} {'wall (s)':>10} {'procs':>6} {'written':>12}"
+        ]
+        for name, phase in sorted(
+            phases.items(), key=lambda p: p[1]["duration"], reverse=True
+        ):
+            lines.append(
+                f"{name:<24} {phase['count']:>6} {phase['duration']:>10.3f}"
+                f" {phase['subprocesses']:>6} {phase['written']:>12}"
+            )
+
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> dict:
+        """Export phases in the Chrome trace event format.
+
+        :return: Trace, loadable in chrome://tracing or Perfetto
+        :rtype: dict
+        """
+
+        trace_events = [
+            {
+                "name": event["name"],
+                "ph": "X",
+                "pid": os.getpid(),
+                "tid": event["tid"],
+                "ts": round(event["start"] * 1e6),
+                "dur": round(event["duration"] * 1e6),
+                "args": dict(
+                    event["args"],
+                    subprocesses=event["subprocesses"],
+                    written=event["written"],
+                ),
+            }
+            for event in self.events
+        ]
+
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def write_trace(self, path: str):
+        """Write phases to a Chrome trace file.
+
+        :param path: Trace file path
+        :type path: str
+        """
+
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
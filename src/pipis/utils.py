@@ -1,17 +1,57 @@
 """utils for pipis"""
 
-from configparser import ConfigParser
-import ctypes
-import importlib
+# heavy modules (pkg_resources, venv, subprocess, ...) are imported by the commands
+# needing them, to keep pipis startup fast
+import json
 from pathlib import Path
 import os
-from shutil import rmtree
-from subprocess import check_call, check_output, CalledProcessError
+import re
+from shutil import copy2, copymode, rmtree
+from stat import S_IMODE, S_ISREG
 import sys
-from venv import EnvBuilder
+import threading
+import time
 
 from pipis import __version__
-import pkg_resources
+from pipis.metadata import (
+    Distribution,
+    DistributionNotFound,
+    find_distribution,
+    safe_name,
+)
+from pipis.trace import NULL_PHASE
+
+# maximum size of the shared wheels cache, in bytes
+CACHE_MAX_SIZE = 2 * 1024**3
+# maximum age of a template venv before it is seeded again, in seconds
+TEMPLATE_TTL = 24 * 60 * 60
+# maximum age of a cached resolution before dependencies are resolved again, in seconds
+RESOLUTION_TTL = 24 * 60 * 60
+# requirements simple enough to be parsed without pkg_resources: name or name==version
+SIMPLE_REQUIREMENT = re.compile(
+    r"([A-Za-z0-9][A-Za-z0-9._-]*)(?:==([A-Za-z0-9.+!-]+))?"
+)
+# run by a venv interpreter to compile a directory with all cores, for each
+# optimization level given as argument (compileall CLI only accepts levels on 3.9+)
+COMPILE_SCRIPT = (
+    "import compileall, sys\n"
+    "ok = [compileall.compile_dir(sys.argv[1], quiet=1, workers=0, optimize=int(x))"
+    " for x in sys.argv[2:]]\n"
+    "sys.exit(not all(ok))\n"
+)
+# minimal launcher of an entry point, importing it directly without any metadata scan
+LAUNCHER = """#!{python}
+# generated by pipis, from the {name} entry point
+import sys
+from {module} import {obj}
+
+if __name__ == "__main__":
+    sys.exit({call}())
+"""
+# packages seeded into every venv, left out of lock files when the template has them
+SEED_PACKAGES = ("distribute", "pip", "setuptools", "wheel")
+# file of a venv site-packages adding the site-packages of its layer to sys.path
+LAYER_PTH = "pipis-layer.pth"
 
 
 class Pipis:
@@ -24,9 +64,50 @@ class Pipis:
     """
 
     def __init__(self, config: dict = None, config_paths: list = None):
-        self.is_admin = self._is_admin()
-        self.config_paths = config_paths or self._get_config_paths()
-        self.config = config or self._get_config()
+        self._config = config
+        self._config_paths = config_paths
+        # set to a pipis.trace.Tracer to record phases timings
+        self.tracer = None
+        # seconds to wait for a venv locked by another process, None waits forever
+        self.lock_timeout = None
+        # seconds before killing a subprocess, None never kills them
+        self.timeout = None
+        # text file receiving subprocesses output as JSON lines
+        self.log = None
+        # install from the wheels cache only, never reaching the index
+        self.offline = False
+        # venvs being built, by package name, used instead of their current venv
+        self._staged = {}
+        # layers upgraded by this process, by key, reused by the next upgrades
+        self._layers_upgraded = set()
+        self._index_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._template_lock = threading.Lock()
+        self._log_lock = threading.Lock()
+
+    @property
+    def is_admin(self) -> bool:
+        """Administrator status of the current user."""
+
+        return self._is_admin()
+
+    @property
+    def config_paths(self) -> list:
+        """Configuration file paths, resolved on first use."""
+
+        if not self._config_paths:
+            self._config_paths = self._get_config_paths()
+
+        return self._config_paths
+
+    @property
+    def config(self) -> dict:
+        """Configuration values, loaded on first use."""
+
+        if not self._config:
+            self._config = self._get_config()
+
+        return self._config
 
     def _is_admin(self) -> bool:
         """Return wether the current user is administrator or not.
@@ -37,6 +118,8 @@ class Pipis:
         try:
             return os.getuid() == 0
         except AttributeError:
+            import ctypes
+
             return ctypes.windll.shell32.IsUserAnAdmin() != 0
 
     def _get_config_paths(self) -> list:
@@ -96,6 +179,8 @@ class Pipis:
         config_file = {}
         for config_path in self.config_paths:
             if Path(config_path).exists():
+                from configparser import ConfigParser
+
                 parser = ConfigParser()
                 parser.read(config_path)
                 config_file.update(dict(parser[name]))
@@ -108,6 +193,117 @@ class Pipis:
 
         return config
 
+    def _phase(self, name: str, package: str = None):
+        """Get a context recording a phase, when tracing is enabled.
+
+        :param name: Phase name
+        :type name: str
+        :param package: Package name, defaults to None
+        :type package: str, optional
+        :return: Phase context
+        :rtype: contextmanager
+        """
+
+        if self.tracer is None:
+            return NULL_PHASE
+
+        return self.tracer.phase(name, package=package)
+
+    def _lock(
+        self, name: str, description: str, timeout: float = None, shared: bool = False
+    ):
+        """Get a context holding an advisory lock shared with other processes.
+
+        :param name: Locked resource name
+        :type name: str
+        :param description: Locked resource, used in the error message
+        :type description: str
+        :param timeout: Seconds to wait for the lock, forever when None, defaults
+            to None
+        :type timeout: float, optional
+        :param shared: Only exclude exclusive holders, to read the resource,
+            defaults to False
+        :type shared: bool, optional
+        :return: Lock context
+        :rtype: contextmanager
+        """
+
+        from pipis.lock import file_lock
+
+        lock_path = self._data_dir_path("locks", f"{name}.lock")
+
+        return file_lock(lock_path, timeout, description, shared)
+
+    def _venv_lock(self, package: str):
+        """Get a context locking a package venv, for `lock_timeout` seconds.
+
+        The lock is shared by every spelling of the package name.
+
+        :param package: Package name
+        :type package: str
+        :return: Lock context
+        :rtype: contextmanager
+        """
+
+        return self._lock(
+            f"venv-{safe_name(package)}",
+            f"Package '{package}'",
+            timeout=self.lock_timeout,
+        )
+
+    def _output_line(self, package: str, stream: str, line: str, quiet: bool):
+        """Show and log a line of a subprocess output.
+
+        :param package: Package the subprocess works on
+        :type package: str
+        :param stream: Output stream name, "stdout" or "stderr"
+        :type stream: str
+        :param line: Output line
+        :type line: str
+        :param quiet: Only log the line
+        :type quiet: bool
+        """
+
+        if self.log is not None:
+            record = {"time": time.time(), "package": package, "stream": stream}
+            record["line"] = line
+            with self._log_lock:
+                self.log.write(json.dumps(record) + "\n")
+        if not quiet:
+            # lines of concurrent installs are told apart by their package
+            prefix = f"{package}: " if package else ""
+            print(prefix + line, file=sys.stdout if stream == "stdout" else sys.stderr)
+
+    def _run(
+        self, cmd: list, output: bool = False, quiet: bool = False, package: str = None
+    ):
+        """Run a command, streaming its output line by line.
+
+        :param cmd: Command
+        :type cmd: list
+        :param output: Return the command output, defaults to False
+        :type output: bool, optional
+        :param quiet: Only log the command output, defaults to False
+        :type quiet: bool, optional
+        :param package: Package the command works on, defaults to None
+        :type package: str, optional
+        :raises subprocess.CalledProcessError: When the command fails
+        :raises subprocess.TimeoutExpired: When the command runs longer than
+            `timeout` seconds
+        :return: Command output, if asked
+        :rtype: bytes
+        """
+
+        from pipis.runner import run
+
+        if self.tracer is not None:
+            self.tracer.count_subprocess()
+
+        def on_line(stream, line):
+            self._output_line(package, stream, line, quiet)
+
+        return run(cmd, on_line, self.timeout, capture=output)
+
     def _normalize_name(self, package: str) -> str:
         """Normalize package name.
 
@@ -117,6 +313,13 @@ class Pipis:
         :rtype: str
         """
 
+        match = SIMPLE_REQUIREMENT.fullmatch(package.strip())
+        if match:
+            # same as pkg_resources.safe_name
+            return re.sub(r"[^A-Za-z0-9.]+", "-", match.group(1))
+
+        import pkg_resources
+
         req = pkg_resources.Requirement(package)
         package_name = req.project_name
 
@@ -131,6 +334,12 @@ class Pipis:
         :rtype: str
         """
 
+        match = SIMPLE_REQUIREMENT.fullmatch(package.strip())
+        if match:
+            return f"=={match.group(2)}" if match.group(2) else ""
+
+        import pkg_resources
+
         req = pkg_resources.Requirement(package)
         package_version = str(req.specifier)
 
@@ -145,8 +354,13 @@ class Pipis:
         :rtype: str
         """
 
+        if package in self._staged:
+            return self._staged[package]
         pipis_venvs = self.config["venvs"]
         venv_dir = str(Path(pipis_venvs, package))
+        # upgraded packages link to their current venv generation
+        if os.path.islink(venv_dir):
+            venv_dir = os.readlink(venv_dir)
 
         return venv_dir
 
@@ -159,23 +373,62 @@ class Pipis:
         :rtype: str
         """
 
-        pipis_venvs = self.config["venvs"]
-        venv_py = str(Path(pipis_venvs, package, "bin", "python"))
+        venv_py = str(Path(self._venv_dir_path(package), "bin", "python"))
 
         return venv_py
 
-    def _dist_info(self, package: str) -> pkg_resources.EggInfoDistribution:
-        """Get dist object for a given package.
+    def _data_dir_path(self, *names: str) -> str:
+        """Get pipis internal data path.
+
+        Internal data is kept in a hidden directory of `PIPIS_VENVS`, so that it
+        lives on the same filesystem as the venvs.
+
+        :param names: Path components inside the data directory
+        :type names: str
+        :return: Data path
+        :rtype: str
+        """
+
+        pipis_venvs = self.config["venvs"]
+        data_dir = str(Path(pipis_venvs, ".pipis", *names))
+
+        return data_dir
+
+    def _venvs_list(self) -> list:
+        """Get the names of the installed packages venvs.
+
+        :return: Packages names
+        :rtype: list
+        """
+
+        pipis_venvs = Path(self.config["venvs"])
+        if not pipis_venvs.is_dir():
+            return []
+        packages = sorted(
+            [
+                x.name
+                for x in pipis_venvs.iterdir()
+                if x.is_dir() and not x.name.startswith(".")
+            ]
+        )
+
+        return packages
+
+    def _venv_site_path(self, package: str) -> str:
+        """Get package venv site-packages path.
 
         :param package: Package name
         :type package: str
-        :return: Package dist object
-        :rtype: pkg_resources.Distribution
+        :return: Site-packages path
+        :rtype: str
         """
 
-        # append package venv path to current path
         venv_dir = self._venv_dir_path(package)
-        venv_path = str(
+        # the venv may have been created by another python version
+        for pattern in ("lib/python*/site-packages", "Lib/site-packages"):
+            for venv_site in Path(venv_dir).glob(pattern):
+                return str(venv_site)
+        venv_site = str(
             Path(
                 venv_dir,
                 "lib",
@@ -183,14 +436,20 @@ class Pipis:
                 "site-packages",
             )
         )
-        sys.path.insert(0, venv_path)
-        # reload pkg_resources module to take into account new path
-        importlib.reload(pkg_resources)
-        # get informations about package
-        dist = pkg_resources.get_distribution(package)
-        # remove package venv from current path
-        index = sys.path.index(venv_path)
-        del sys.path[index]
+
+        return venv_site
+
+    def _dist_info(self, package: str) -> Distribution:
+        """Get dist object for a given package.
+
+        :param package: Package name
+        :type package: str
+        :return: Package dist object
+        :rtype: Distribution
+        """
+
+        venv_site = self._venv_site_path(package)
+        dist = find_distribution([venv_site], package)
 
         return dist
 
@@ -219,36 +478,270 @@ class Pipis:
         # get informations about package
         dist = self._dist_info(package)
         # init list
-        scripts = []
+        paths = []
         # get scripts from RECORD file
         if dist.has_metadata("RECORD"):
             files = dist.get_metadata_lines("RECORD")
-            for line in files:
-                script_path = Path(dist.location, line.split(",")[0]).resolve()
-                scripts.append(script_path)
+            paths = [os.path.join(dist.location, x.split(",")[0]) for x in files]
         # get scripts from installed-files.txt file
         elif dist.has_metadata("installed-files.txt"):
             files = dist.get_metadata_lines("installed-files.txt")
-            for line in files:
-                script_path = Path(dist.egg_info, line.split(",")[0]).resolve()
-                scripts.append(script_path)
+            paths = [os.path.join(dist.egg_info, x.split(",")[0]) for x in files]
         # get scripts from entry_points.txt file
         elif dist.has_metadata("entry_points.txt"):
-            scripts = [
-                Path(script_path).resolve()
-                for script_path in dist.get_entry_map("console_scripts").keys()
-            ]
+            paths = list(dist.get_entry_map("console_scripts").keys())
 
-        # filter only binaries
-        venv_bin_pattern = str(Path(self._venv_dir_path(package), "bin", "*"))
-        scripts = [
-            str(script_path)
-            for script_path in scripts
-            if script_path.match(venv_bin_pattern)
-        ]
+        # filter only binaries, only them are resolved: resolving every file of
+        # a large RECORD costs a few syscalls each
+        venv_bin = os.path.abspath(os.path.join(self._venv_dir_path(package), "bin"))
+        venv_bin_real = os.path.realpath(venv_bin)
+        scripts = []
+        for path in paths:
+            if os.path.dirname(os.path.normpath(os.path.abspath(path))) != venv_bin:
+                continue
+            script = os.path.realpath(path)
+            if os.path.dirname(script) == venv_bin_real:
+                scripts.append(script)
 
         return scripts
 
+    def _venv_config(self, package: str) -> dict:
+        """Get the configuration of a package venv, from its pyvenv.cfg.
+
+        :param package: Package name
+        :type package: str
+        :return: Configuration values by key
+        :rtype: dict
+        """
+
+        config = {}
+        pyvenv_cfg = Path(self._venv_dir_path(package), "pyvenv.cfg")
+        if pyvenv_cfg.exists():
+            for line in pyvenv_cfg.read_text().splitlines():
+                key, _, value = line.partition("=")
+                config[key.strip()] = value.strip()
+
+        return config
+
+    def _venv_python_version(self, package: str) -> str:
+        """Get the python version of a package venv.
+
+        :param package: Package name
+        :type package: str
+        :return: Python version
+        :rtype: str
+        """
+
+        return self._venv_config(package).get("version", "")
+
+    def _venv_size(self, package: str) -> int:
+        """Get the disk usage of a package venv, files hardlinked inside the venv
+        are counted once.
+
+        :param package: Package name
+        :type package: str
+        :return: Size in bytes
+        :rtype: int
+        """
+
+        size = 0
+        inodes = set()
+        for root, _, files in os.walk(self._venv_dir_path(package)):
+            for name in files:
+                try:
+                    stat = os.lstat(os.path.join(root, name))
+                except OSError:
+                    continue
+                if stat.st_nlink > 1:
+                    if (stat.st_dev, stat.st_ino) in inodes:
+                        continue
+                    inodes.add((stat.st_dev, stat.st_ino))
+                size += stat.st_size
+
+        return size
+
+    def _index_entry(
+        self, package: str, scripts: list = None, launchers: bool = False
+    ) -> dict:
+        """Build the index entry of a given package.
+
+        :param package: Package name
+        :type package: str
+        :param scripts: Package scripts, defaults to None
+        :type scripts: list, optional
+        :param launchers: Package installed with `--launchers`, defaults to False
+        :type launchers: bool, optional
+        :return: Index entry
+        :rtype: dict
+        """
+
+        venv_site = self._venv_site_path(package)
+        entry = {
+            "version": self._package_version(package),
+            "python": self._venv_python_version(package),
+            "scripts": scripts or self._package_scripts(package),
+            "size": self._venv_size(package),
+            "mtime": os.stat(venv_site).st_mtime_ns,
+            "launchers": launchers,
+        }
+
+        return entry
+
+    def _read_json(self, path: str) -> dict:
+        """Read a JSON data file.
+
+        :param path: File path
+        :type path: str
+        :return: File content, empty when the file is missing or invalid
+        :rtype: dict
+        """
+
+        try:
+            data = json.loads(Path(path).read_text())
+        except (FileNotFoundError, ValueError):
+            data = {}
+
+        return data
+
+    def _write_json(self, path: str, data: dict):
+        """Write a JSON data file atomically.
+
+        :param path: File path
+        :type path: str
+        :param data: File content
+        :type data: dict
+        """
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file then rename, to never leave a partial file
+        path_tmp = f"{path}.{os.getpid()}.{threading.get_ident()}"
+        Path(path_tmp).write_text(json.dumps(data, indent=2, sort_keys=True))
+        os.replace(path_tmp, path)
+
+    def _read_index(self) -> dict:
+        """Read the installed packages index.
+
+        :return: Index entries by package name
+        :rtype: dict
+        """
+
+        index = self._read_json(self._data_dir_path("index.json"))
+
+        return index
+
+    def _write_index(self, index: dict):
+        """Write the installed packages index.
+
+        :param index: Index entries by package name
+        :type index: dict
+        """
+
+        self._write_json(self._data_dir_path("index.json"), index)
+
+    def _update_index(self, package: str, scripts: list = None, launchers: bool = None):
+        """Add or refresh a package in the index.
+
+        :param package: Package name
+        :type package: str
+        :param scripts: Package scripts, defaults to None
+        :type scripts: list, optional
+        :param launchers: Package installed with `--launchers`, defaults to the
+            recorded value
+        :type launchers: bool, optional
+        """
+
+        entry = self._index_entry(package, scripts)
+        with self._index_lock, self._lock("index", "The index"):
+            index = self._read_index()
+            if launchers is None:
+                launchers = index.get(package, {}).get("launchers", False)
+            entry["launchers"] = launchers
+            index[package] = entry
+            self._write_index(index)
+
+    def _remove_index(self, package: str):
+        """Remove a package from the index.
+
+        :param package: Package name
+        :type package: str
+        """
+
+        with self._index_lock, self._lock("index", "The index"):
+            index = self._read_index()
+            if index.pop(package, None) is not None:
+                self._write_index(index)
+
+    def _iter_installed(self, jobs: int = 1):
+        """Yield the index entries of installed packages, sorted by name.
+
+        Entries are yielded as soon as they are available. An entry is stale when
+        its venv site-packages has been modified since it was indexed, only those
+        are rebuilt from the package metadata, concurrently when `jobs` > 1.
+        Rebuilt entries are written to the index once all of them are yielded.
+
+        :param jobs: Maximum number of entries rebuilt concurrently, defaults to 1
+        :type jobs: int, optional
+        """
+
+        index = self._read_index()
+        packages = self._venvs_list()
+        changed = {package: None for package in set(index) - set(packages)}
+
+        def fresh_entry(package):
+            entry = index.get(package)
+            try:
+                mtime = os.stat(self._venv_site_path(package)).st_mtime_ns
+                if entry is None or entry["mtime"] != mtime or "size" not in entry:
+                    # the launchers option is not found in the venv, it is kept
+                    launchers = (entry or {}).get("launchers", False)
+                    entry = changed[package] = self._index_entry(
+                        package, launchers=launchers
+                    )
+            except (OSError, DistributionNotFound):
+                # broken or partially created venv
+                entry = None
+                if package in index:
+                    changed[package] = None
+            return entry
+
+        if jobs > 1:
+            from concurrent.futures import ThreadPoolExecutor
+
+            executor = ThreadPoolExecutor(max_workers=jobs)
+            entries = executor.map(fresh_entry, packages)
+        else:
+            executor = None
+            entries = map(fresh_entry, packages)
+        try:
+            for package, entry in zip(packages, entries):
+                if entry is not None:
+                    yield package, entry
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        if changed:
+            # merged into the current index, it may have been updated meanwhile
+            with self._index_lock, self._lock("index", "The index"):
+                index = self._read_index()
+                for package, entry in changed.items():
+                    if entry is None:
+                        index.pop(package, None)
+                    else:
+                        index[package] = entry
+                self._write_index(index)
+
+    def _installed_packages(self) -> dict:
+        """Get the index of installed packages, refreshing stale entries.
+
+        :return: Index entries by package name
+        :rtype: dict
+        """
+
+        index = dict(self._iter_installed())
+
+        return index
+
     def _requirements_list(self, requirement: str) -> list:
         """Get packages list of a given requirements file.
 
@@ -262,11 +755,229 @@ class Pipis:
         requirements = [
             r
             for r in Path(requirement).read_text().splitlines()
-            if not r.startswith("#")
+            if r.strip() and not r.startswith("#")
         ]
 
         return requirements
 
+    def _packages_list(self, args: list) -> list:
+        """Get packages list from command line packages and requirements file.
+
+        :param args: Command line arguments
+        :type args: list
+        :raises Exception: When no package is given
+        :return: Packages list
+        :rtype: list
+        """
+
+        packages = args.package
+        if isinstance(packages, str):
+            packages = [packages]
+        packages = list(packages or [])
+        requirement = getattr(args, "requirement", None)
+        if requirement:
+            packages += self._requirements_list(requirement)
+        if not packages:
+            raise Exception("You must give at least one package")
+
+        return packages
+
+    def _sync_file(self, path: str) -> dict:
+        """Read a desired state file.
+
+        Each line holds a requirement, in the `freeze` format, optionally followed
+        by the `install` options `-d`/`--dependency` (repeatable), `-s`/`--system`,
+        `--no-pip` and `--launchers`.
+
+        :param path: Desired state file path
+        :type path: str
+        :raises Exception: When a line holds an unknown option, or an option
+            without its value
+        :return: Desired state by package name
+        :rtype: dict
+        """
+
+        import shlex
+
+        desired = {}
+        for line in Path(path).read_text().splitlines():
+            tokens = shlex.split(line, comments=True)
+            if not tokens:
+                continue
+            requirement, options = tokens[0], iter(tokens[1:])
+            state = {
+                "requirement": requirement,
+                "dependencies": [],
+                "system": False,
+                "no_pip": False,
+                "launchers": False,
+            }
+            for option in options:
+                if option in ("-d", "--dependency"):
+                    dependency = next(options, "")
+                    if not dependency or dependency.startswith("-"):
+                        raise Exception(f"Missing value of option '{option}' in {path}")
+                    state["dependencies"].append(dependency)
+                elif option in ("-s", "--system"):
+                    state["system"] = True
+                elif option == "--no-pip":
+                    state["no_pip"] = True
+                elif option == "--launchers":
+                    state["launchers"] = True
+                else:
+                    raise Exception(f"Unknown option '{option}' in {path}")
+            desired[self._normalize_name(requirement)] = state
+
+        return desired
+
+    def _version_match(self, requirement: str, version: str) -> bool:
+        """Return wether a version satisfies a requirement or not.
+
+        :param requirement: Requirement
+        :type requirement: str
+        :param version: Version
+        :type version: str
+        :return: Requirement satisfaction
+        :rtype: bool
+        """
+
+        specifier = self._normalize_version(requirement)
+        if not specifier or specifier == f"=={version}":
+            return True
+
+        import pkg_resources
+
+        return version in pkg_resources.Requirement(requirement)
+
+    def _venv_dependencies(self, package: str) -> set:
+        """Get the dependencies added to a package venv.
+
+        :param package: Package name
+        :type package: str
+        :return: Requirements of the venv requirements file
+        :rtype: set
+        """
+
+        requirements = Path(self._venv_dir_path(package), "requirements.txt")
+        dependencies = set()
+        if requirements.is_file():
+            dependencies = set(requirements.read_text().splitlines())
+
+        return dependencies
+
+    def _sync_plan(self, desired: dict, uninstall: bool = True) -> dict:
+        """Diff a desired state against the installed packages.
+
+        :param desired: Desired state by package name
+        :type desired: dict
+        :param uninstall: Uninstall packages missing from the desired state,
+            defaults to True
+        :type uninstall: bool, optional
+        :return: Action ("install", "update" or "uninstall") by package name
+        :rtype: dict
+        """
+
+        index = self._installed_packages()
+        plan = {}
+        for package, state in desired.items():
+            entry = index.get(package)
+            if entry is None:
+                plan[package] = "install"
+                continue
+            dependencies = self._venv_dependencies(package)
+            venv_config = self._venv_config(package)
+            system = venv_config.get("include-system-site-packages") == "true"
+            if (
+                not self._version_match(state["requirement"], entry["version"])
+                or dependencies != set(state["dependencies"])
+                or system != state["system"]
+                or self._venv_has_pip(package) == state["no_pip"]
+                or entry.get("launchers", False) != state["launchers"]
+            ):
+                plan[package] = "update"
+        if uninstall:
+            for package in index:
+                if package not in desired and not self._is_own_venv(package):
+                    plan[package] = "uninstall"
+
+        return plan
+
+    def _is_own_venv(self, package: str) -> bool:
+        """Check if a package is pipis itself or the venv running pipis.
+
+        :param package: Package name
+        :type package: str
+        :return: True if the package venv must not be removed by `sync`
+        :rtype: bool
+        """
+
+        if package == "pipis":
+            return True
+        venv_dir = os.path.realpath(self._venv_dir_path(package))
+
+        return venv_dir == os.path.realpath(sys.prefix)
+
+    def _run_jobs(self, func, packages: list, jobs: int = 1) -> dict:
+        """Run a function for each package with a bounded pool of workers.
+
+        Errors are collected instead of stopping the other packages.
+
+        :param func: Function called with each package name
+        :type func: callable
+        :param packages: Packages list
+        :type packages: list
+        :param jobs: Maximum number of concurrent workers, defaults to 1
+        :type jobs: int, optional
+        :return: Function results (or raised exception) by package name
+        :rtype: dict
+        """
+
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            futures = {executor.submit(func, package): package for package in packages}
+            for future in as_completed(futures):
+                package = futures[future]
+                try:
+                    results[package] = future.result()
+                except Exception as error:
+                    results[package] = error
+
+        return results
+
+    def _outdated_packages(self, packages: list, jobs: int = 1) -> list:
+        """Get the installed packages which have a newer release on the index.
+
+        Only the index is queried, no pip process is run.
+
+        :param packages: Packages list
+        :type packages: list
+        :param jobs: Maximum number of concurrent index requests, defaults to 1
+        :type jobs: int, optional
+        :return: Outdated packages list
+        :rtype: list
+        """
+
+        import pkg_resources
+        from pipis.pypi import latest_version
+
+        index = self._installed_packages()
+        packages = [package for package in packages if package in index]
+        results = self._run_jobs(latest_version, packages, jobs)
+        outdated = []
+        for package in packages:
+            latest = results[package]
+            if isinstance(latest, Exception):
+                print(f"Cannot check {package}: {latest}", file=sys.stderr)
+                continue
+            latest = pkg_resources.parse_version(latest or "0")
+            version = pkg_resources.parse_version(index[package]["version"])
+            if latest > version:
+                outdated.append(package)
+
+        return outdated
+
     def _add_dependency(self, package: str, dependency: str) -> str:
         """Create or append requirements files for a given package.
 
@@ -291,153 +1002,1550 @@ class Pipis:
 
         return requirement
 
-    def _create_venv(self, package: str, system: bool = False) -> str:
-        """Create package dedicated virtualenv.
+    def _closure_wheels(self, package: str, wheels: dict = None) -> list:
+        """Get the distributions installed in a package venv, with their wheel.
 
         :param package: Package name
         :type package: str
-        :param system: Enable system packages, defaults to False
-        :type system: bool, optional
+        :param wheels: Cached wheels infos by file name, defaults to the cache ones
+        :type wheels: dict, optional
+        :return: (name, version, cached wheel file name or None) tuples
+        :rtype: list
         """
 
-        package = self._normalize_name(package)
-        venv_dir = self._venv_dir_path(package)
-        # create or update venv
-        venv_build = EnvBuilder(
-            system_site_packages=system, clear=False, symlinks=True, with_pip=True
-        )
-        if not Path(venv_dir).is_dir():
-            venv_build.create(venv_dir)
-
-        return venv_dir
-
-    def _install_dep(self, cmd: list, package: str, dependency: str = None):
-        """Install a given dependency package into the package venv.
+        candidates_by_pin = {}
+        for name in wheels if wheels is not None else self._cache_wheels():
+            parts = name[: -len(".whl")].split("-")
+            if len(parts) >= 5:
+                candidates_by_pin.setdefault(
+                    (safe_name(parts[0]), parts[1]), []
+                ).append((parts[-3:], name))
+
+        sites = [self._venv_site_path(package)]
+        layer = self._venv_layer(package)
+        if layer and Path(layer).is_dir():
+            # distributions of the layer are part of the closure, unless shadowed
+            sites.append(layer)
+        # seed packages are left to the venv creation, unless their version
+        # differs from the one it provides
+        seeds = self._template_seeds() if self._venv_has_pip(package) else {}
+        pins = []
+        pinned = set()
+        entries = [
+            (venv_site, entry) for venv_site in sites for entry in os.scandir(venv_site)
+        ]
+        for venv_site, entry in entries:
+            stem, ext = os.path.splitext(entry.name)
+            if ext != ".dist-info":
+                continue
+            dist = Distribution(venv_site, entry.path)
+            name, version = dist.project_name, dist.version
+            if safe_name(name) in pinned:
+                continue
+            pinned.add(safe_name(name))
+            if venv_site == sites[0] and seeds.get(safe_name(name)) == version:
+                continue
+            candidates = candidates_by_pin.get((safe_name(name), version), [])
+            if len(candidates) > 1 and dist.has_metadata("WHEEL"):
+                # pick the wheel whose tags match the installed one
+                installed = set(
+                    line.partition(":")[2].strip()
+                    for line in dist.get_metadata_lines("WHEEL")
+                    if line.startswith("Tag:")
+                )
+                candidates = [
+                    (tags, wheel)
+                    for tags, wheel in candidates
+                    if any(
+                        f"{py}-{abi}-{plat}" in installed
+                        for py in tags[0].split(".")
+                        for abi in tags[1].split(".")
+                        for plat in tags[2].split(".")
+                    )
+                ]
+            wheel = candidates[0][1] if len(candidates) == 1 else None
+            pins.append((name, version, wheel))
+        pins.sort(key=lambda pin: pin[0].lower())
+
+        return pins
+
+    def _lock_closure(self, package: str) -> list:
+        """Get the pinned closure of the distributions installed in a package venv.
+
+        Hashes are the ones of the cached wheels the distributions were installed
+        from. When one of them is missing from the cache, no hash is given at all,
+        since pip requires hashes for every requirement or for none.
 
-        :param cmd: Install command for the main package
-        :type cmd: list
         :param package: Package name
         :type package: str
-        :param dependency: Dependency package name, defaults to None
-        :type dependency: str, optional
+        :return: Requirements lines, `name==version` with their `--hash` options
+        :rtype: list
         """
 
-        package = self._normalize_name(package)
-        venv_dir = self._venv_dir_path(package)
-        # set requirements file path
-        dependencies = str(Path(venv_dir, "requirements.txt"))
-        # if a dependency is passed, add it to requirements
-        if dependency:
-            dependencies = self._add_dependency(package, dependency)
-        # install dependencies if needed
-        if Path(dependencies).exists():
-            check_call(cmd + ["--requirement", dependencies])
-
-    def _create_link(self, package: str, upgrade: bool = False):
-        """Create or update symlinks for a given package.
+        wheels = self._cache_wheels()
+        pins = self._closure_wheels(package, wheels)
+        with_hashes = all(wheel for _, _, wheel in pins)
+        lines = [
+            f"{name}=={version}"
+            + (f" --hash=sha256:{wheels[wheel]['sha256']}" if with_hashes else "")
+            for name, version, wheel in pins
+        ]
+
+        return lines
+
+    def _write_lock(self, package: str, lock: str = None) -> str:
+        """Write the lock file of a package venv, next to its requirements file.
 
         :param package: Package name
         :type package: str
-        :param upgrade: Enable link re-creation, defaults to False
-        :type upgrade: bool, optional
-        :raises Exception: When package has no scripts
+        :param lock: Lock file path, defaults to the one of the venv
+        :type lock: str, optional
+        :return: Lock file path
+        :rtype: str
         """
 
-        pipis_bin = self.config["bin"]
-        package = self._normalize_name(package)
-        venv_dir = self._venv_dir_path(package)
-        scripts = self._package_scripts(package)
-        # check if there is no scripts
-        if len(scripts) < 1:
-            rmtree(venv_dir)
-            raise Exception("library installation is not supported by pipis")
-        # link each script found
-        for script in scripts:
-            script_name = Path(script).name
-            target = Path(pipis_bin, script_name)
-            if target.exists() and str(target.resolve()) == script:
-                # already linked to script
-                continue
-            elif target.exists() and upgrade:
-                # replace existing target
-                target.unlink()
-                target.symlink_to(script)
-            elif not target.exists():
-                # does not exist, create
-                target.symlink_to(script)
-            else:
-                # exists and linked to different script, but not asked to update
-                continue
+        lock = lock or str(Path(self._venv_dir_path(package), "requirements.lock"))
+        lines = ["# generated by pipis, install with: pip install --no-deps -r"]
+        lines += self._lock_closure(package)
+        Path(lock).write_text("\n".join(lines) + "\n")
 
-    def _confirm(self, message: str = None):
-        """Ask for confirmation."""
+        return lock
 
-        if message:
-            print(message)
-        choice = input("Do you want to continue [y/N]? ").lower()
+    def _read_lock(self, lock: str) -> dict:
+        """Read the pinned versions of a lock file.
 
-        if choice not in ["y", "yes"]:
-            print("Exit.")
-            exit(0)
+        :param lock: Lock file path
+        :type lock: str
+        :return: Versions by normalized package name
+        :rtype: dict
+        """
 
-    def show_version(self, args: list, **kwargs: dict) -> str:
-        """show pipis version"""
+        pins = {}
+        for line in Path(lock).read_text().splitlines():
+            requirement = line.split(" ")[0]
+            name, sep, version = requirement.partition("==")
+            if sep:
+                pins[safe_name(name)] = version
 
-        message = f"pipis version: {__version__}"
-        print(message)
+        return pins
 
-        return message
+    def _locked(self, lock: str, package: str, requirement: str) -> bool:
+        """Return wether a lock file pins a version satisfying a requirement.
 
-    def freeze(self, args: list, **kwargs: dict) -> dict:
-        """output installed packages in requirements format"""
+        :param lock: Lock file path
+        :type lock: str
+        :param package: Package name
+        :type package: str
+        :param requirement: Package requirement
+        :type requirement: str
+        :return: Requirement satisfaction by the lock file
+        :rtype: bool
+        """
 
-        pipis_venvs = Path(self.config["venvs"])
-        packages = sorted([x.name for x in pipis_venvs.iterdir() if x.is_dir()])
+        if not Path(lock).is_file():
+            return False
+        version = self._read_lock(lock).get(safe_name(package))
+
+        return version is not None and self._version_match(requirement, version)
+
+    def _file_hash(self, path: str) -> str:
+        """Get the SHA256 hash of a file.
+
+        :param path: File path
+        :type path: str
+        :return: Hexadecimal digest
+        :rtype: str
+        """
+
+        import hashlib
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+
+        return digest.hexdigest()
+
+    def _parse_size(self, size: str) -> int:
+        """Parse a human readable size (ex: `500M`, `2G`) to bytes.
+
+        :param size: Size
+        :type size: str
+        :return: Size in bytes
+        :rtype: int
+        """
+
+        units = {"K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+        size = str(size).strip().upper().rstrip("B")
+        if size and size[-1] in units:
+            return int(float(size[:-1]) * units[size[-1]])
+
+        return int(size)
+
+    def _format_size(self, size: int) -> str:
+        """Format a size in bytes to a human readable size.
+
+        :param size: Size in bytes
+        :type size: int
+        :return: Human readable size
+        :rtype: str
+        """
+
+        for unit in ("B", "KiB", "MiB", "GiB"):
+            if size < 1024:
+                break
+            size /= 1024
+        else:
+            unit = "TiB"
+
+        return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+
+    def _cache_wheels(self) -> dict:
+        """Get the wheels of the cache.
+
+        :return: Wheels infos (sha256, size) by file name
+        :rtype: dict
+        """
+
+        wheels = self._read_json(self._data_dir_path("wheels.json"))
+
+        return wheels
+
+    def _cache_add(self, wheel_dir: str) -> list:
+        """Move the new wheels of a directory into the cache.
+
+        :param wheel_dir: Directory containing built or downloaded wheels
+        :type wheel_dir: str
+        :return: Added wheels file names
+        :rtype: list
+        """
+
+        wheelhouse = self._data_dir_path("wheels")
+        added = []
+        with self._cache_lock, self._lock("cache", "The wheels cache"):
+            wheels = self._cache_wheels()
+            for wheel in Path(wheel_dir).glob("*.whl"):
+                target = Path(wheelhouse, wheel.name)
+                if target.exists():
+                    continue
+                wheels[wheel.name] = {
+                    "sha256": self._file_hash(str(wheel)),
+                    "size": wheel.stat().st_size,
+                }
+                os.replace(str(wheel), str(target))
+                added.append(wheel.name)
+            if added:
+                self._write_json(self._data_dir_path("wheels.json"), wheels)
+
+        return added
+
+    def _wheels_lock(self, shared: bool = False, timeout: float = None):
+        """Get a context locking the wheels files of the cache.
+
+        Installs hold it shared while pip reads the cache, eviction holds it
+        exclusive while removing wheels. It is always taken before the lock of
+        `wheels.json`.
+
+        :param shared: Lock to read the wheels, defaults to False
+        :type shared: bool, optional
+        :param timeout: Seconds to wait for the lock, forever when None, defaults
+            to None
+        :type timeout: float, optional
+        :return: Lock context
+        :rtype: contextmanager
+        """
+
+        return self._lock("wheels", "The wheels cache", timeout, shared)
+
+    def _cache_evict(self, max_size: int, timeout: float = None) -> list:
+        """Remove least recently used wheels until the cache fits in max size.
+
+        Wheels are only removed once no pip, of any pipis process, is reading the
+        cache, see `_wheels_lock`.
+
+        :param max_size: Maximum cache size in bytes
+        :type max_size: int
+        :param timeout: Seconds to wait for the cache readers, forever when None,
+            defaults to None
+        :type timeout: float, optional
+        :raises LockTimeout: When the cache is still read after the timeout
+        :return: Removed wheels file names
+        :rtype: list
+        """
+
+        wheelhouse = Path(self._data_dir_path("wheels"))
+        removed = []
+        with self._wheels_lock(timeout=timeout), self._cache_lock, self._lock(
+            "cache", "The wheels cache"
+        ):
+            wheels = self._cache_wheels()
+            stale = [name for name in wheels if not Path(wheelhouse, name).exists()]
+            for name in stale:
+                del wheels[name]
+            files = [
+                (max(w.stat().st_atime, w.stat().st_mtime), w)
+                for w in wheelhouse.glob("*.whl")
+            ]
+            size = sum(w.stat().st_size for _, w in files)
+            for _, wheel in sorted(files):
+                if size <= max_size:
+                    break
+                size -= wheel.stat().st_size
+                wheel.unlink()
+                wheels.pop(wheel.name, None)
+                removed.append(wheel.name)
+            if removed or stale:
+                self._write_json(self._data_dir_path("wheels.json"), wheels)
+
+        return removed
+
+    def _index_fingerprint(self) -> str:
+        """Get a fingerprint of the index state seen by pip.
+
+        It covers the index pip is configured with and the ETag of the last
+        refresh of the search snapshot from this index, so that refreshing the
+        snapshot of a changed index invalidates the resolutions made before.
+
+        :return: Hexadecimal digest
+        :rtype: str
+        """
+
+        import hashlib
+
+        from pipis import pypi
+
+        source = pypi.index_url()
+        state = [source]
+        state += [os.getenv(x, "") for x in ("PIP_EXTRA_INDEX_URL", "PIP_FIND_LINKS")]
+        info = self._read_json(self._data_dir_path("search", "projects.json"))
+        if info.get("source") == source:
+            state.append(info.get("etag") or "")
+
+        return hashlib.sha256("\n".join(state).encode("utf-8")).hexdigest()
+
+    def _resolution_key(
+        self,
+        requirements: list,
+        system: bool = False,
+        layer: str = None,
+        with_pip: bool = True,
+    ) -> str:
+        """Get the key of the resolution of a requirements set.
+
+        :param requirements: Requirements of the main package and its dependencies
+        :type requirements: list
+        :param system: Resolved in a venv with system packages, defaults to False
+        :type system: bool, optional
+        :param layer: Layer site-packages of the venv, defaults to None
+        :type layer: str, optional
+        :param with_pip: Resolved in a venv seeded with pip, defaults to True
+        :type with_pip: bool, optional
+        :return: Hexadecimal digest of the normalized requirements, interpreter,
+            platform, layer, seeding and index fingerprint
+        :rtype: str
+        """
+
+        import hashlib
+        import sysconfig
+
+        requirements = sorted(
+            safe_name(self._normalize_name(x)) + self._normalize_version(x)
+            for x in requirements
+        )
+        interpreter = sys.implementation.cache_tag + getattr(sys, "abiflags", "")
+        key = {
+            "requirements": requirements,
+            "interpreter": f"{interpreter}-{sysconfig.get_platform()}",
+            "system": system,
+            "index": self._index_fingerprint(),
+        }
+        if layer:
+            key["layer"] = layer
+        if not with_pip:
+            # locks of seeded venvs leave out the seed packages of the template
+            key["seeded"] = False
+        data = json.dumps(key, sort_keys=True).encode("utf-8")
+
+        return hashlib.sha256(data).hexdigest()
+
+    def _resolutions_stats(self, **counts: dict) -> dict:
+        """Get the resolutions cache statistics, incremented by the given counts.
+
+        :param counts: Counts to add, by name ("hits" or "misses")
+        :type counts: dict
+        :return: Counts by name
+        :rtype: dict
+        """
+
+        stats_path = self._data_dir_path("resolutions.json")
+        if not counts:
+            return self._read_json(stats_path)
+        with self._lock("resolutions", "The resolutions cache"):
+            stats = self._read_json(stats_path)
+            for name, count in counts.items():
+                stats[name] = stats.get(name, 0) + count
+            self._write_json(stats_path, stats)
+
+        return stats
+
+    def _cached_resolution(self, key: str) -> str:
+        """Get a cached resolution, expired ones are removed.
+
+        :param key: Resolution key
+        :type key: str
+        :return: Lock file of the resolved closure, None when missing or expired
+        :rtype: str
+        """
+
+        lock = Path(self._data_dir_path("resolutions", f"{key}.lock"))
+        try:
+            if time.time() - lock.stat().st_mtime < RESOLUTION_TTL:
+                self._resolutions_stats(hits=1)
+                return str(lock)
+            lock.unlink()
+        except FileNotFoundError:
+            pass
+        self._resolutions_stats(misses=1)
+
+        return None
+
+    def _cache_resolution(self, key: str, lock: str):
+        """Cache a resolved closure.
+
+        :param key: Resolution key
+        :type key: str
+        :param lock: Lock file of the resolved closure
+        :type lock: str
+        """
+
+        target = Path(self._data_dir_path("resolutions", f"{key}.lock"))
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # copy to a temporary file then rename, to never expose a partial file
+        target_tmp = f"{target}.{os.getpid()}.{threading.get_ident()}"
+        copy2(lock, target_tmp)
+        os.replace(target_tmp, str(target))
+        os.utime(str(target))
+
+    def _resolutions_evict(self, ttl: float = RESOLUTION_TTL) -> list:
+        """Remove expired resolutions.
+
+        :param ttl: Maximum age of resolutions, in seconds, defaults to
+            RESOLUTION_TTL
+        :type ttl: float, optional
+        :return: Removed resolutions keys
+        :rtype: list
+        """
+
+        removed = []
+        for lock in Path(self._data_dir_path("resolutions")).glob("*.lock"):
+            try:
+                if time.time() - lock.stat().st_mtime >= ttl:
+                    lock.unlink()
+                    removed.append(lock.stem)
+            except FileNotFoundError:
+                pass
+
+        return removed
+
+    def _pip_install(
+        self, cmd: list, requirements: list, upgrade: bool = False, package: str = None
+    ):
+        """Install requirements through the shared wheels cache.
+
+        Unless upgrading, requirements are first installed from the cache only,
+        without network access. Otherwise wheels are downloaded or built once into
+        the cache and then installed from it. Offline, the cache is never filled.
+
+        :param cmd: Pip install command
+        :type cmd: list
+        :param requirements: Requirements arguments, options are not allowed
+        :type requirements: list
+        :param upgrade: Look for newer versions on the index, defaults to False
+        :type upgrade: bool, optional
+        :param package: Package being installed, defaults to None
+        :type package: str, optional
+        :raises subprocess.CalledProcessError: When requirements cannot be installed
+        """
+
+        from subprocess import CalledProcessError
+        import tempfile
+
+        from pipis.lock import LockTimeout
+
+        wheelhouse = self._data_dir_path("wheels")
+        Path(wheelhouse).mkdir(parents=True, exist_ok=True)
+        offline_cmd = cmd + ["--no-index", "--find-links", wheelhouse] + requirements
+
+        if not upgrade or self.offline:
+            try:
+                with self._phase("pip_install_cached", package), self._wheels_lock(
+                    shared=True
+                ):
+                    self._run(offline_cmd, quiet=not self.offline, package=package)
+                return
+            except CalledProcessError:
+                if self.offline:
+                    raise
+
+        # fill the cache, wheels are gathered in a temporary directory first to not
+        # expose partial files to concurrent installs
+        wheel_dir = tempfile.mkdtemp(dir=self._data_dir_path())
+        try:
+            wheel_cmd = cmd[: cmd.index("install")]
+            wheel_cmd += ["wheel", "--wheel-dir", wheel_dir]
+            for option in ("--quiet", "--no-deps"):
+                if option in cmd:
+                    wheel_cmd.append(option)
+            with self._phase("pip_wheel", package), self._wheels_lock(shared=True):
+                wheel_cmd += ["--find-links", wheelhouse] + requirements
+                self._run(wheel_cmd, package=package)
+            with self._phase("cache_add", package):
+                self._cache_add(wheel_dir)
+        finally:
+            rmtree(wheel_dir)
+        with self._phase("cache_evict", package):
+            try:
+                self._cache_evict(CACHE_MAX_SIZE, timeout=0)
+            except LockTimeout:
+                # the cache is being read, one of the next installs evicts it
+                pass
+
+        with self._phase("pip_install", package), self._wheels_lock(shared=True):
+            self._run(offline_cmd, package=package)
+
+    def _template_dir_path(self) -> str:
+        """Get the template venv path of the current python interpreter.
+
+        :return: Template venv path
+        :rtype: str
+        """
+
+        import hashlib
+
+        executable = getattr(sys, "_base_executable", sys.executable)
+        digest = hashlib.sha256(executable.encode("utf-8")).hexdigest()[:8]
+        name = f"python{sys.version_info.major}.{sys.version_info.minor}-{digest}"
+        template_dir = self._data_dir_path("templates", name)
+
+        return template_dir
+
+    def _template_seeds(self) -> dict:
+        """Get the seed packages installed in the template venv, if it exists.
+
+        :return: Seed packages version by safe name
+        :rtype: dict
+        """
+
+        seeds = {}
+        template_dir = Path(self._template_dir_path())
+        for pattern in ("lib/python*/site-packages", "Lib/site-packages"):
+            for template_site in template_dir.glob(pattern):
+                for entry in template_site.glob("*.dist-info"):
+                    dist = Distribution(str(template_site), str(entry))
+                    if safe_name(dist.project_name) in SEED_PACKAGES:
+                        seeds[safe_name(dist.project_name)] = dist.version
+
+        return seeds
+
+    def _template_venv(self) -> str:
+        """Get a seeded template venv, creating or refreshing it if needed.
+
+        The template is built aside and then renamed into place, its build path is
+        recorded to be able to relocate its scripts when cloning it.
+
+        :return: Template venv path
+        :rtype: str
+        """
+
+        from subprocess import CalledProcessError
+        import tempfile
+        from venv import EnvBuilder
+
+        template_dir = self._template_dir_path()
+        template_info = Path(template_dir, "pipis-template.json")
+        with self._template_lock, self._lock("template-build", "The template venv"):
+            created = self._read_json(str(template_info)).get("created", 0)
+            if time.time() - created < TEMPLATE_TTL:
+                return template_dir
+
+            Path(template_dir).parent.mkdir(parents=True, exist_ok=True)
+            build_dir = tempfile.mkdtemp(dir=str(Path(template_dir).parent))
+            try:
+                venv_build = EnvBuilder(clear=True, symlinks=True, with_pip=True)
+                venv_build.create(build_dir)
+                cmd = [str(Path(build_dir, "bin", "python")), "-m", "pip", "install"]
+                cmd += ["--quiet", "--upgrade"]
+                try:
+                    self._pip_install(cmd, ["pip", "wheel"], upgrade=not self.offline)
+                except CalledProcessError:
+                    # offline, keep the pip bundled with python when not cached
+                    if not self.offline:
+                        # no index available, seed from the cache
+                        self._pip_install(cmd, ["pip", "wheel"])
+                self._write_json(
+                    str(Path(build_dir, template_info.name)),
+                    {"path": build_dir, "created": time.time()},
+                )
+                # swap the old template with the new one, once no venv is cloning it
+                with self._lock("template", "The template venv"):
+                    if Path(template_dir).exists():
+                        old_dir = tempfile.mkdtemp(dir=str(Path(template_dir).parent))
+                        os.replace(template_dir, str(Path(old_dir, "venv")))
+                        rmtree(old_dir)
+                    os.replace(build_dir, template_dir)
+            finally:
+                if Path(build_dir).exists():
+                    rmtree(build_dir)
+
+        return template_dir
+
+    def _clone_file(self, src: str, dst: str):
+        """Clone a file as a hardlink, or as a copy across filesystems.
+
+        :param src: Source file path
+        :type src: str
+        :param dst: Destination file path
+        :type dst: str
+        """
+
+        try:
+            os.link(src, dst)
+        except OSError:
+            copy2(src, dst)
+
+    def _clone_venv(self, template_dir: str, venv_dir: str, system: bool = False):
+        """Create a venv by cloning a template venv.
+
+        Files of the template are hardlinked, except the scripts and the venv
+        configuration which refer to the template path and are rewritten.
+
+        :param template_dir: Template venv path
+        :type template_dir: str
+        :param venv_dir: Venv path
+        :type venv_dir: str
+        :param system: Enable system packages, defaults to False
+        :type system: bool, optional
+        """
+
+        template_info = Path(template_dir, "pipis-template.json")
+        build_dir = self._read_json(str(template_info))["path"].encode("utf-8")
+        for root, dirs, files in os.walk(template_dir):
+            rel_root = os.path.relpath(root, template_dir)
+            venv_root = os.path.normpath(os.path.join(venv_dir, rel_root))
+            os.makedirs(venv_root, exist_ok=True)
+            for name in dirs + files:
+                src = os.path.join(root, name)
+                dst = os.path.join(venv_root, name)
+                if os.path.islink(src):
+                    os.symlink(os.readlink(src), dst)
+                elif name in dirs or src == str(template_info):
+                    continue
+                elif rel_root in ("bin", "Scripts") or name == "pyvenv.cfg":
+                    content = Path(src).read_bytes()
+                    Path(dst).write_bytes(
+                        content.replace(build_dir, venv_dir.encode("utf-8"))
+                    )
+                    copymode(src, dst)
+                else:
+                    self._clone_file(src, dst)
+
+        if system:
+            pyvenv_cfg = Path(venv_dir, "pyvenv.cfg")
+            pyvenv_cfg.write_text(
+                pyvenv_cfg.read_text().replace(
+                    "include-system-site-packages = false",
+                    "include-system-site-packages = true",
+                )
+            )
+
+    def _create_venv(
+        self, package: str, system: bool = False, with_pip: bool = True
+    ) -> str:
+        """Create package dedicated virtualenv.
+
+        The venv is cloned from the seeded template venv, falling back on a full
+        venv creation if the template cannot be built.
+
+        :param package: Package name
+        :type package: str
+        :param system: Enable system packages, defaults to False
+        :type system: bool, optional
+        :param with_pip: Install pip into the venv, defaults to True
+        :type with_pip: bool, optional
+        """
+
+        from subprocess import CalledProcessError
+        from venv import EnvBuilder
+
+        package = self._normalize_name(package)
+        venv_dir = self._venv_dir_path(package)
+        if Path(venv_dir).is_dir():
+            return venv_dir
+        if not with_pip:
+            # nothing to seed, a bare venv is as fast as a clone
+            venv_build = EnvBuilder(
+                system_site_packages=system, clear=False, symlinks=True
+            )
+            venv_build.create(venv_dir)
+            return venv_dir
+        try:
+            with self._phase("template_venv", package):
+                template_dir = self._template_venv()
+            with self._phase("clone_venv", package), self._lock(
+                "template", "The template venv", shared=True
+            ):
+                self._clone_venv(template_dir, venv_dir, system)
+        except (OSError, CalledProcessError, KeyError):
+            if Path(venv_dir).exists():
+                rmtree(venv_dir)
+            venv_build = EnvBuilder(
+                system_site_packages=system, clear=False, symlinks=True, with_pip=True
+            )
+            venv_build.create(venv_dir)
+
+        return venv_dir
+
+    def _dedupe_venv(self, package: str) -> int:
+        """Replace the site-packages files of a package venv by hardlinks to a
+        content-addressed store shared by all venvs.
+
+        Stored files are made read-only. Pip unlinks files before writing them, so
+        upgrading a deduplicated venv never alters the files of the others.
+
+        :param package: Package name
+        :type package: str
+        :return: Reclaimed bytes
+        :rtype: int
+        """
+
+        store = Path(self._data_dir_path("store"))
+        reclaimed = 0
+        for root, _, files in os.walk(self._venv_site_path(package)):
+            for name in files:
+                path = os.path.join(root, name)
+                stat = os.lstat(path)
+                # skip symlinks and files already shared (store or template)
+                if not S_ISREG(stat.st_mode) or stat.st_nlink > 1:
+                    continue
+                mode = S_IMODE(stat.st_mode)
+                key = f"{self._file_hash(path)}-{mode:o}"
+                stored = store / key[:2] / key
+                stored.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    # new content, the file becomes the stored copy
+                    os.link(path, str(stored))
+                    os.chmod(str(stored), mode & ~0o222)
+                    continue
+                except FileExistsError:
+                    pass
+                except OSError:
+                    # not on the same filesystem as the store
+                    continue
+                path_tmp = f"{path}.pipis-dedupe"
+                os.link(str(stored), path_tmp)
+                os.replace(path_tmp, path)
+                reclaimed += stat.st_size
+
+        return reclaimed
+
+    def _store_gc(self) -> int:
+        """Remove the stored files which are not used by any venv anymore.
+
+        :return: Reclaimed bytes
+        :rtype: int
+        """
+
+        store = Path(self._data_dir_path("store"))
+        reclaimed = 0
+        if store.is_dir():
+            for stored in store.glob("*/*"):
+                stat = stored.stat()
+                if stat.st_nlink == 1:
+                    stored.unlink()
+                    reclaimed += stat.st_size
+
+        return reclaimed
+
+    def _write_launchers(self, package: str) -> list:
+        """Replace the entry points scripts of a package by minimal launchers.
+
+        Scripts generated by old setuptools, or for egg-info installs, load their
+        entry point through `pkg_resources`, which scans the metadata of every
+        installed package on each launch.
+
+        :param package: Package name
+        :type package: str
+        :return: Replaced scripts paths
+        :rtype: list
+        """
+
+        dist = self._dist_info(package)
+        venv_bin = os.path.join(self._venv_dir_path(package), "bin")
+        python = self._venv_py_path(package)
+        launchers = []
+        for group in ("console_scripts", "gui_scripts"):
+            for name, value in dist.get_entry_map(group).items():
+                # drop extras, ex: `module:func [extra]`
+                module, _, call = value.split("[")[0].partition(":")
+                module, call = module.strip(), call.strip()
+                script = os.path.join(venv_bin, name)
+                if not call or not os.path.isfile(script):
+                    continue
+                content = LAUNCHER.format(
+                    python=python,
+                    name=name,
+                    module=module,
+                    obj=call.split(".")[0],
+                    call=call,
+                )
+                # replace the script with a rename, it may be running
+                script_tmp = f"{script}.{os.getpid()}.{threading.get_ident()}"
+                Path(script_tmp).write_text(content)
+                copymode(script, script_tmp)
+                os.replace(script_tmp, script)
+                launchers.append(script)
+
+        return launchers
+
+    def _compile_venv(self, package: str, optimize: list = None) -> bool:
+        """Compile the bytecode of a package venv site-packages.
+
+        Files are compiled by the venv interpreter, in a process pool using all
+        the cores, so that scripts do not compile them on their first launch.
+
+        :param package: Package name
+        :type package: str
+        :param optimize: Optimization levels, defaults to [0]
+        :type optimize: list, optional
+        :return: Wether every file was compiled or not
+        :rtype: bool
+        """
+
+        from subprocess import CalledProcessError
+
+        levels = [str(x) for x in sorted(set(optimize or [0]))]
+        cmd = [self._venv_py_path(package), "-c", COMPILE_SCRIPT]
+        cmd += [self._venv_site_path(package)] + levels
+        try:
+            # files which cannot be compiled, like python 2 tests, are only logged
+            self._run(cmd, quiet=True, package=package)
+        except CalledProcessError:
+            return False
+
+        return True
+
+    def _venv_has_pip(self, package: str) -> bool:
+        """Return wether pip is installed in a package venv or not.
+
+        :param package: Package name
+        :type package: str
+        :return: Pip installation status
+        :rtype: bool
+        """
+
+        return Path(self._venv_site_path(package), "pip").is_dir()
+
+    def _pip_cmd(self, package: str) -> list:
+        """Get the pip command targeting a package venv.
+
+        Venvs created without pip are driven by the pip of the interpreter running
+        pipis (the `pipis` venv), through its `--python` option.
+
+        :param package: Package name
+        :type package: str
+        :return: Pip command
+        :rtype: list
+        """
+
+        venv_py = self._venv_py_path(package)
+        if self._venv_has_pip(package):
+            cmd = [venv_py, "-m", "pip"]
+        else:
+            self._check_pip_python()
+            cmd = [sys.executable, "-m", "pip", "--python", venv_py]
+
+        return cmd
+
+    def _check_pip_python(self):
+        """Check that the pip of pipis can drive another interpreter.
+
+        :raises Exception: When pip is missing or older than 22.3, which added the
+            `--python` option
+        """
+
+        try:
+            from pip import __version__ as pip_version
+        except ImportError:
+            pip_version = "none"
+
+        match = re.match(r"(\d+)\.(\d+)", pip_version)
+        if not match or tuple(int(x) for x in match.groups()) < (22, 3):
+            raise Exception(
+                f"Venvs without pip need pip>=22.3 in the pipis venv, not {pip_version}"
+            )
+
+    def _add_dependencies(self, package: str, dependency: list = None) -> list:
+        """Add dependencies to the requirements file of a package venv.
+
+        :param package: Package name
+        :type package: str
+        :param dependency: Dependency package name, or names, defaults to None
+        :type dependency: str or list, optional
+        :return: Requirements arguments of pip, empty without requirements file
+        :rtype: list
+        """
+
+        package = self._normalize_name(package)
+        venv_dir = self._venv_dir_path(package)
+        # set requirements file path
+        dependencies = str(Path(venv_dir, "requirements.txt"))
+        # if dependencies are passed, add them to requirements
+        if isinstance(dependency, str):
+            dependency = [dependency]
+        for name in dependency or []:
+            dependencies = self._add_dependency(package, name)
+        if not Path(dependencies).exists():
+            return []
+
+        return ["--requirement", dependencies]
+
+    def _create_link(self, package: str, upgrade: bool = False) -> list:
+        """Create or update symlinks for a given package.
+
+        :param package: Package name
+        :type package: str
+        :param upgrade: Enable link re-creation, defaults to False
+        :type upgrade: bool, optional
+        :raises Exception: When package has no scripts
+        :return: Package scripts
+        :rtype: list
+        """
+
+        pipis_bin = self.config["bin"]
+        package = self._normalize_name(package)
+        venv_dir = self._venv_dir_path(package)
+        scripts = self._package_scripts(package)
+        # check if there is no scripts
+        if len(scripts) < 1:
+            rmtree(venv_dir)
+            raise Exception("library installation is not supported by pipis")
+        # never link the scripts of a broken venv
+        for script in scripts:
+            if not os.access(script, os.X_OK):
+                raise Exception(f"Script '{script}' is missing or not executable")
+        # the links are diffed against a single scan of the bin dir, locked as a
+        # whole since links may be claimed by other packages installed concurrently
+        with self._lock("bin", "The scripts links"):
+            links = self._bin_links()
+            changes = []
+            for script in scripts:
+                script_name = os.path.basename(script)
+                if script_name not in links:
+                    changes.append(script)
+                    continue
+                target, owner = links[script_name]
+                if target == script:
+                    # already linked to script
+                    continue
+                elif owner == package or not os.path.exists(
+                    os.path.join(pipis_bin, script_name)
+                ):
+                    # linked to another venv generation, or broken
+                    changes.append(script)
+                    continue
+                conflict = f"package '{owner}'" if owner else "a file not from pipis"
+                if upgrade:
+                    print(
+                        f"Script '{script_name}' of {conflict} is replaced",
+                        file=sys.stderr,
+                    )
+                    changes.append(script)
+                else:
+                    print(
+                        f"Script '{script_name}' conflicts with {conflict}, not linked",
+                        file=sys.stderr,
+                    )
+            for script in changes:
+                # create or replace the link with a rename, it is never missing
+                script_name = os.path.basename(script)
+                target_tmp = os.path.join(
+                    pipis_bin, f".{script_name}.{os.getpid()}.{threading.get_ident()}"
+                )
+                os.symlink(script, target_tmp)
+                os.replace(target_tmp, os.path.join(pipis_bin, script_name))
+
+        return scripts
+
+    def _script_owner(self, target: str, prefixes: tuple) -> str:
+        """Get the package owning a link target.
+
+        :param target: Link target
+        :type target: str
+        :param prefixes: Paths of the venvs dir, ending with a separator
+        :type prefixes: tuple
+        :return: Package name, None when the target is not in a pipis venv
+        :rtype: str
+        """
+
+        for prefix in prefixes:
+            if not target.startswith(prefix):
+                continue
+            parts = target.replace(prefix, "", 1).split(os.sep)
+            if parts[:2] == [".pipis", "generations"] and len(parts) > 3:
+                return parts[2]
+            elif len(parts) > 1 and not parts[0].startswith("."):
+                return parts[0]
+
+        return None
+
+    def _bin_links(self) -> dict:
+        """Scan the bin dir, to get the package owning each script.
+
+        This reverse index of the links is never stored: the links targets tell
+        their package, and the bin dir is read in a single `scandir`.
+
+        :return: Link target and package name, None for files not linked to a
+            pipis venv, by script name
+        :rtype: dict
+        """
+
+        pipis_venvs = self.config["venvs"]
+        prefixes = tuple(
+            {os.path.join(x, "") for x in (pipis_venvs, os.path.realpath(pipis_venvs))}
+        )
+        links = {}
+        try:
+            entries = os.scandir(self.config["bin"])
+        except FileNotFoundError:
+            return links
+        with entries:
+            for entry in entries:
+                # skip links being created
+                if entry.name.startswith("."):
+                    continue
+                target = os.readlink(entry.path) if entry.is_symlink() else None
+                owner = self._script_owner(target, prefixes) if target else None
+                links[entry.name] = (target, owner)
+
+        return links
+
+    def _unlink_scripts(self, package: str, keep: list = None):
+        """Remove the links of a package.
+
+        Links claimed by another package in the meantime are kept.
+
+        :param package: Package name
+        :type package: str
+        :param keep: Scripts paths whose names are still linked, defaults to None
+        :type keep: list, optional
+        """
+
+        pipis_bin = self.config["bin"]
+        kept_names = {os.path.basename(script) for script in keep or []}
+        with self._lock("bin", "The scripts links"):
+            for script_name, (_, owner) in self._bin_links().items():
+                if owner == package and script_name not in kept_names:
+                    os.unlink(os.path.join(pipis_bin, script_name))
+
+    def _generation_dir_path(self, package: str, generation: str = None) -> str:
+        """Get the path of a venv generation of a package.
+
+        Upgrades build a new venv generation next to the current one, which is
+        kept for rollback.
+
+        :param package: Package name
+        :type package: str
+        :param generation: Generation name, defaults to a new one
+        :type generation: str, optional
+        :return: Venv generation path
+        :rtype: str
+        """
+
+        if generation is None:
+            generation = str(int(time.time() * 1000000))
+
+        return self._data_dir_path("generations", package, generation)
+
+    def _generations_list(self, package: str) -> list:
+        """Get the venv generations paths of a package, oldest first.
+
+        :param package: Package name
+        :type package: str
+        :return: Venv generations paths
+        :rtype: list
+        """
+
+        generations_dir = Path(self._data_dir_path("generations", package))
+        if not generations_dir.is_dir():
+            return []
+        generations = sorted(
+            [x for x in generations_dir.iterdir() if x.name.isdigit()],
+            key=lambda x: int(x.name),
+        )
+
+        return [str(x) for x in generations]
+
+    def _switch_venv(self, package: str, venv_dir: str) -> str:
+        """Make a venv generation the current venv of a package.
+
+        `PIPIS_VENVS/<package>` is a symlink to the current generation, replaced
+        with a rename so that it is never missing.
+
+        :param package: Package name
+        :type package: str
+        :param venv_dir: Venv generation path
+        :type venv_dir: str
+        :return: Path of the replaced venv, None for new packages
+        :rtype: str
+        """
+
+        pipis_venvs = self.config["venvs"]
+        link = Path(pipis_venvs, package)
+        previous = None
+        if link.is_symlink():
+            previous = os.readlink(link)
+        elif link.is_dir():
+            # venv created before generations, moved to be kept as a generation
+            previous = self._generation_dir_path(package, "0")
+            if Path(previous).exists():
+                rmtree(previous)
+            os.rename(link, previous)
+        link_tmp = Path(
+            pipis_venvs, f".{package}.{os.getpid()}.{threading.get_ident()}"
+        )
+        link_tmp.symlink_to(os.path.abspath(venv_dir))
+        os.replace(link_tmp, link)
+
+        return previous
+
+    def _generations_gc(self, package: str, keep: list) -> list:
+        """Remove the venv generations of a package, except the given ones.
+
+        :param package: Package name
+        :type package: str
+        :param keep: Venv generations paths to keep
+        :type keep: list
+        :return: Removed venv generations paths
+        :rtype: list
+        """
+
+        # links to generations are absolute, generations paths may be relative
+        keep = [os.path.realpath(x) for x in keep if x]
+        removed = [
+            x
+            for x in self._generations_list(package)
+            if os.path.realpath(x) not in keep
+        ]
+        for generation in removed:
+            rmtree(generation, ignore_errors=True)
+
+        return removed
+
+    def _layer_key(self, requirements: list) -> str:
+        """Get the key of the layer of a dependencies set.
+
+        :param requirements: Layer requirements
+        :type requirements: list
+        :return: Hexadecimal digest of the normalized requirements and interpreter
+        :rtype: str
+        """
+
+        import hashlib
+
+        requirements = sorted(
+            safe_name(self._normalize_name(x)) + self._normalize_version(x)
+            for x in requirements
+        )
+        key = {
+            "requirements": requirements,
+            "interpreter": Path(self._template_dir_path()).name,
+        }
+        data = json.dumps(key, sort_keys=True).encode("utf-8")
+
+        return hashlib.sha256(data).hexdigest()[:16]
+
+    def _layer_versions(self, key: str) -> list:
+        """Get the complete versions of a layer, oldest first.
+
+        :param key: Layer key
+        :type key: str
+        :return: Layer versions paths
+        :rtype: list
+        """
+
+        layer_dir = Path(self._data_dir_path("layers", key))
+        if not layer_dir.is_dir():
+            return []
+        versions = sorted(
+            [
+                x
+                for x in layer_dir.iterdir()
+                if x.name.isdigit() and Path(x, "layer.json").is_file()
+            ],
+            key=lambda x: int(x.name),
+        )
+
+        return [str(x) for x in versions]
+
+    def _layer_info(self, layer: str) -> dict:
+        """Get the infos of the layer version holding a site-packages.
+
+        :param layer: Layer site-packages path
+        :type layer: str
+        :return: Layer infos (requirements, pins, site, created), empty when the
+            path is not a layer one
+        :rtype: dict
+        """
+
+        layers = self._data_dir_path("layers")
+        try:
+            key, version = Path(layer).relative_to(layers).parts[:2]
+        except ValueError:
+            return {}
+
+        return self._read_json(str(Path(layers, key, version, "layer.json")))
+
+    def _venv_layer(self, package: str) -> str:
+        """Get the layer site-packages a package venv refers to.
+
+        :param package: Package name
+        :type package: str
+        :return: Layer site-packages path, None without layer
+        :rtype: str
+        """
+
+        pth = Path(self._venv_site_path(package), LAYER_PTH)
+        try:
+            layer = pth.read_text().strip()
+        except FileNotFoundError:
+            return None
+
+        return layer or None
+
+    def _layer_venv(self, requirements: list, upgrade: bool = False) -> str:
+        """Get a layer venv holding a dependencies set, building it if needed.
+
+        Layers are venvs without pip shared by the package venvs, which refer to
+        their site-packages through a `.pth` file: pip sees the layer
+        distributions as installed and only installs the missing or conflicting
+        ones into the package venv. Upgrading builds a new version of the layer,
+        kept only when its closure changed, older versions stay in use by the venvs
+        referring to them until they are upgraded.
+
+        :param requirements: Layer requirements
+        :type requirements: list
+        :param upgrade: Look for newer versions on the index, defaults to False
+        :type upgrade: bool, optional
+        :raises Exception: When the layer cannot be built
+        :return: Layer site-packages path
+        :rtype: str
+        """
+
+        from subprocess import CalledProcessError
+
+        key = self._layer_key(requirements)
+        name = f"layer-{key}"
+        with self._lock(name, f"Layer '{key}'"):
+            versions = self._layer_versions(key)
+            if versions and (not upgrade or key in self._layers_upgraded):
+                return self._read_json(str(Path(versions[-1], "layer.json")))["site"]
+
+            layer_dir = self._data_dir_path("layers", key, str(int(time.time() * 1e6)))
+            self._staged[name] = layer_dir
+            try:
+                with self._phase("create_venv", name):
+                    self._create_venv(name, with_pip=False)
+                cmd = self._pip_cmd(name) + ["install", "--quiet", "--no-compile"]
+                if upgrade:
+                    cmd.append("--upgrade")
+                with self._phase("install_layer", name):
+                    self._pip_install(cmd, requirements, upgrade, name)
+                info = {
+                    "requirements": sorted(requirements),
+                    "pins": {n: v for n, v, _ in self._closure_wheels(name)},
+                    # .pth lines are relative to the site-packages holding them
+                    "site": os.path.abspath(self._venv_site_path(name)),
+                    "created": time.time(),
+                }
+                latest = {}
+                if versions:
+                    latest = self._read_json(str(Path(versions[-1], "layer.json")))
+                if latest.get("pins") == info["pins"]:
+                    # nothing was upgraded, keep the current version
+                    rmtree(layer_dir)
+                    info = latest
+                else:
+                    with self._phase("compile", name):
+                        self._compile_venv(name)
+                    self._write_json(str(Path(layer_dir, "layer.json")), info)
+            except CalledProcessError:
+                rmtree(layer_dir, ignore_errors=True)
+                raise Exception(f"Cannot build layer {', '.join(requirements)}")
+            except Exception:
+                rmtree(layer_dir, ignore_errors=True)
+                raise
+            finally:
+                self._staged.pop(name)
+            if upgrade:
+                self._layers_upgraded.add(key)
+
+        return info["site"]
+
+    def _layer_compatible(self, package: str, requirements: list) -> bool:
+        """Return wether a venv and its layer satisfy requirements or not.
+
+        Distributions of the venv shadow the ones of the layer, as in `sys.path`.
+
+        :param package: Package name
+        :type package: str
+        :param requirements: Requirements of the package and its dependencies
+        :type requirements: list
+        :return: Requirements satisfaction, False when the package itself is
+            provided by the layer
+        :rtype: bool
+        """
+
+        import pkg_resources
+
+        venv_site = self._venv_site_path(package)
+        dists = {}
+        for site in (venv_site, self._venv_layer(package)):
+            for entry in os.scandir(site):
+                stem, ext = os.path.splitext(entry.name)
+                if ext in (".dist-info", ".egg-info"):
+                    key = safe_name(stem.split("-")[0])
+                    dists.setdefault(key, Distribution(site, entry.path))
+        dist = dists.get(safe_name(self._normalize_name(package)))
+        if dist is None or dist.location != venv_site:
+            return False
+
+        pending, checked = list(requirements), set()
+        while pending:
+            requirement = pending.pop()
+            if requirement in checked:
+                continue
+            checked.add(requirement)
+            try:
+                req = pkg_resources.Requirement(requirement)
+                dist = dists.get(safe_name(req.project_name))
+                if dist is None or dist.version not in req:
+                    return False
+                for line in dist.requires():
+                    sub = pkg_resources.Requirement(line)
+                    if not sub.marker or any(
+                        sub.marker.evaluate({"extra": extra})
+                        for extra in ("",) + req.extras
+                    ):
+                        pending.append(line.split(";")[0].strip())
+            except ValueError:
+                return False
+
+        return True
+
+    def _layers_gc(self) -> list:
+        """Remove the layer versions which no venv refers to, except the latest.
+
+        :return: Removed layer versions paths
+        :rtype: list
+        """
+
+        used = set()
+        for package in self._venvs_list():
+            venv_dirs = {self._venv_dir_path(package)}
+            venv_dirs.update(self._generations_list(package))
+            for venv_dir in venv_dirs:
+                for pattern in ("lib/python*/site-packages", "Lib/site-packages"):
+                    for pth in Path(venv_dir).glob(f"{pattern}/{LAYER_PTH}"):
+                        used.add(pth.read_text().strip())
+
+        layers = Path(self._data_dir_path("layers"))
+        removed = []
+        for key in sorted(layers.iterdir()) if layers.is_dir() else []:
+            with self._lock(f"layer-{key.name}", f"Layer '{key.name}'"):
+                latest = self._layer_versions(key.name)[-1:]
+                for version in key.iterdir():
+                    site = self._read_json(str(Path(version, "layer.json"))).get("site")
+                    if str(version) not in latest and (not site or site not in used):
+                        rmtree(str(version), ignore_errors=True)
+                        removed.append(str(version))
+
+        return removed
+
+    def _confirm(self, message: str = None):
+        """Ask for confirmation."""
+
+        if message:
+            print(message)
+        choice = input("Do you want to continue [y/N]? ").lower()
+
+        if choice not in ["y", "yes"]:
+            print("Exit.")
+            exit(0)
+
+    def show_version(self, args: list, **kwargs: dict) -> str:
+        """show pipis version"""
+
+        message = f"pipis version: {__version__}"
+        print(message)
+
+        return message
+
+    def freeze(self, args: list, **kwargs: dict) -> list:
+        """output installed packages, in requirements or JSON format"""
+
+        output = getattr(args, "format", None) or "requirements"
+        jobs = getattr(args, "jobs", 1)
         freeze = []
-        for package in packages:
-            package_version = self._package_version(package)
-            freeze.append(f"{package}=={package_version}")
-            print(f"{package}=={package_version}")
+        with self._phase("installed_packages"):
+            for package, entry in self._iter_installed(jobs):
+                record = {
+                    "name": package,
+                    "version": entry["version"],
+                    "python": entry["python"],
+                    "scripts": entry["scripts"],
+                    "size": entry["size"],
+                }
+                if output == "requirements":
+                    print(f"{package}=={entry['version']}")
+                elif output == "jsonl":
+                    print(json.dumps(record), flush=True)
+                else:
+                    # a JSON array, streamed one record at a time
+                    prefix = "[\n  " if not freeze else ",\n  "
+                    print(prefix + json.dumps(record), end="", flush=True)
+                freeze.append(record)
+        if output == "json":
+            print("\n]" if freeze else "[]")
 
         return freeze
 
+    def _refresh_search(self, source: str = None) -> int:
+        """Refresh the local snapshot of the index projects.
+
+        The snapshot is only rewritten when the index changed since the last
+        refresh, and summaries missing from the index (PEP 503 and PEP 691
+        indexes have none) are kept from the previous snapshot.
+
+        :param source: Index URL, local mirror directory or JSON dump file,
+            defaults to the source of the last refresh, or to pip index
+        :type source: str, optional
+        :return: Number of projects in the snapshot
+        :rtype: int
+        """
+
+        from pipis import pypi, search
+
+        snapshot_path = self._data_dir_path("search", "projects.txt")
+        info_path = self._data_dir_path("search", "projects.json")
+        info = self._read_json(info_path)
+        source = source or info.get("source") or pypi.index_url()
+        etag = None
+        if source == info.get("source") and Path(snapshot_path).is_file():
+            etag = info.get("etag")
+
+        projects, etag = pypi.project_list(source, etag)
+        if projects is not None:
+            previous = search.read_snapshot(snapshot_path)
+            for name, summary in projects.items():
+                if not summary:
+                    projects[name] = previous.get(name, "")
+            search.write_snapshot(snapshot_path, projects)
+            info["count"] = len(projects)
+        info.update(source=source, etag=etag, updated=time.time())
+        self._write_json(info_path, info)
+
+        return info["count"]
+
     def search(self, args: list, **kwargs: dict) -> str:
         """search for PyPI packages whose name or summary contains <query>"""
 
-        venv_py = self._venv_py_path("pipis")
-        # define pip install cmd
-        cmd = [venv_py, "-m", "pip", "search", args.query]
-        # set verbosity
-        if args.verbose:
-            cmd.append("--verbose")
-        # run search
-        try:
-            search = check_output(cmd).decode("utf-8")
-        except CalledProcessError:
+        from pipis.search import search_snapshot
+
+        snapshot_path = self._data_dir_path("search", "projects.txt")
+        refresh = getattr(args, "refresh", False)
+        if not args.query and not refresh:
+            raise Exception("A query is required")
+        if refresh or not Path(snapshot_path).is_file():
+            with self._phase("refresh_search"):
+                count = self._refresh_search(getattr(args, "index", None))
+            if refresh:
+                print(f"Search index refreshed, {count} projects")
+        if not args.query:
+            return ""
+
+        with self._phase("search_snapshot"):
+            results = search_snapshot(snapshot_path, args.query)
+        if results:
+            search = "\n".join(
+                f"{name} - {summary}" if summary else name for name, summary in results
+            )
+        else:
             search = f"Package '{args.query}' not found"
         print(search)
 
         return search
 
-    def install(self, args: list, **kwargs: dict) -> list:
-        """install packages"""
+    def _install_venv(
+        self,
+        package: str,
+        version: str,
+        args: list,
+        system: bool,
+        with_pip: bool,
+        lock: str = None,
+        launchers: bool = False,
+        layer: str = None,
+    ) -> list:
+        """Install a package into its venv and link its scripts.
+
+        The installed closure is recorded in the `requirements.lock` file of the
+        venv. When a lock file is given, its closure is installed instead, without
+        resolving dependencies.
 
-        state = "installed" if not args.upgrade else "updated"
-        if not args.yes:
-            self._confirm(f"Package '{args.package}' will be {state}.")
+        :param package: Package name
+        :type package: str
+        :param version: Package version specifier
+        :type version: str
+        :param args: Command line arguments
+        :type args: list
+        :param system: Enable system packages in a new venv
+        :type system: bool
+        :param with_pip: Install pip into a new venv
+        :type with_pip: bool
+        :param lock: Lock file to install, defaults to None
+        :type lock: str, optional
+        :param launchers: Replace the scripts by minimal launchers, defaults to
+            False
+        :type launchers: bool, optional
+        :param layer: Layer site-packages referred to by a new venv, defaults to
+            None
+        :type layer: str, optional
+        :raises Exception: When package cannot be installed
+        :return: Package scripts
+        :rtype: list
+        """
 
-        package = self._normalize_name(args.package)
-        version = self._normalize_version(args.package)
-        venv_dir = self._create_venv(package, args.system)
-        venv_py = self._venv_py_path(package)
+        from subprocess import CalledProcessError
+
+        new_venv = not Path(self._venv_dir_path(package)).is_dir()
+        with self._phase("create_venv", package):
+            venv_dir = self._create_venv(package, system, with_pip)
+        layer_pth = Path(self._venv_site_path(package), LAYER_PTH)
+        if new_venv and layer:
+            layer_pth.write_text(f"{layer}\n")
+        # keep the dependencies of the replaced venv
+        requirements = Path(self.config["venvs"], package, "requirements.txt")
+        keep_options = getattr(args, "keep_options", True)
+        if new_venv and keep_options and requirements.is_file():
+            copy2(str(requirements), venv_dir)
 
         # define pip install cmd
-        cmd = [venv_py, "-m", "pip", "install"]
+        cmd = self._pip_cmd(package) + ["install"]
         # set verbosity
         if not args.verbose:
             cmd.append("--quiet")
-        # upgrade pip in venv
-        check_call(cmd + ["--upgrade", "pip", "wheel"])
+        # bytecode is compiled in parallel once installed
+        cmd.append("--no-compile")
         # set upgrade
         if args.upgrade:
             cmd.append("--upgrade")
@@ -445,20 +2553,534 @@ class Pipis:
         if args.ignore_installed:
             cmd.append("--ignore-installed")
 
+        # new venvs resolve their requirements once, later installs of the same
+        # requirements install the cached closure, even unpinned ones, until it
+        # expires or the index fingerprint changes (upgrades always resolve)
+        resolution = None
+        if new_venv and not lock:
+            dependencies = args.dependency or []
+            if isinstance(dependencies, str):
+                dependencies = [dependencies]
+            requirements = [package + version] + sorted(
+                self._venv_dependencies(package).union(dependencies)
+            )
+            with self._phase("resolution_cache", package):
+                resolution = self._resolution_key(requirements, system, layer, with_pip)
+                if not args.upgrade:
+                    lock = self._cached_resolution(resolution)
+
         # install package (and eventual dependencies) in venv
         try:
-            check_call(cmd + [package + version])
-            self._install_dep(cmd, package, args.dependency)
+            if lock:
+                try:
+                    with self._phase("install_locked", package):
+                        self._pip_install(
+                            cmd + ["--no-deps"],
+                            ["--requirement", lock],
+                            package=package,
+                        )
+                except CalledProcessError:
+                    if resolution is None:
+                        raise
+                    # the cached closure cannot be installed anymore, resolve again
+                    lock = None
+            # record the dependencies, lock files closures already hold them
+            dependencies = self._add_dependencies(package, args.dependency)
+            if not lock:
+                # the package and its dependencies are resolved together, by a
+                # single pip transaction
+                with self._phase("install_main", package):
+                    self._pip_install(
+                        cmd, [package + version] + dependencies, args.upgrade, package
+                    )
+            requirements = [package + version]
+            requirements += sorted(self._venv_dependencies(package))
+            if layer_pth.is_file() and not self._layer_compatible(
+                package, requirements
+            ):
+                # the layer conflicts with the package, the venv gets its own copies
+                layer_pth.unlink()
+                with self._phase("install_unlayered", package):
+                    self._pip_install(
+                        cmd, [package + version] + dependencies, package=package
+                    )
         except CalledProcessError:
-            if not args.upgrade:
+            if not args.upgrade and Path(venv_dir).exists():
                 rmtree(venv_dir)
             raise Exception(f"Cannot install {package}")
-        self._create_link(package, args.upgrade)
+        with self._phase("write_lock", package):
+            venv_lock = self._write_lock(package)
+            if resolution is not None and not lock:
+                self._cache_resolution(resolution, venv_lock)
+        if launchers:
+            with self._phase("write_launchers", package):
+                self._write_launchers(package)
+        with self._phase("compile", package):
+            self._compile_venv(package, getattr(args, "optimize", None))
+        if getattr(args, "dedupe", False):
+            with self._phase("dedupe", package):
+                self._dedupe_venv(package)
+        # the bin links are switched last, once nothing else can fail
+        with self._phase("create_link", package):
+            scripts = self._create_link(package, args.upgrade)
+
+        return scripts
+
+    def _install_package(self, package: str, args: list) -> list:
+        """Install or upgrade a package and link its scripts.
+
+        :param package: Package name
+        :type package: str
+        :param args: Command line arguments
+        :type args: list
+        :raises Exception: When package cannot be installed
+        :return: Package scripts
+        :rtype: list
+        """
+
+        state = "installed" if not args.upgrade else "updated"
+        version = self._normalize_version(package)
+        package = self._normalize_name(package)
+        exists = Path(self._venv_dir_path(package)).is_dir()
+        system, with_pip = args.system, not getattr(args, "no_pip", False)
+        launchers = getattr(args, "launchers", False)
+        layer = getattr(args, "layer", None)
+        if exists and getattr(args, "keep_options", True):
+            # a new generation keeps the options of the current venv
+            venv_config = self._venv_config(package)
+            system = system or venv_config.get("include-system-site-packages") == "true"
+            with_pip = with_pip and self._venv_has_pip(package)
+            entry = self._read_index().get(package, {})
+            launchers = launchers or entry.get("launchers", False)
+            current_layer = self._venv_layer(package)
+            if not layer and current_layer:
+                layer = self._layer_info(current_layer).get("requirements")
+        # reinstalls reuse the closure locked by the current venv, when it still
+        # satisfies the requirement and no dependency is added
+        lock = getattr(args, "lock", None)
+        if lock and not self._locked(lock, package, package + version):
+            raise Exception(f"Package {package}{version} is not locked in {lock}")
+        current_lock = str(Path(self._venv_dir_path(package), "requirements.lock"))
+        if (
+            not lock
+            and exists
+            and args.ignore_installed
+            and not args.upgrade
+            and not args.dependency
+            and self._locked(current_lock, package, package + version)
+        ):
+            lock = current_lock
+        # new, upgraded and locked packages are built in a new venv generation, the
+        # current venv is left untouched and in use until the switch
+        blue_green = args.upgrade or not exists or bool(lock)
+        if blue_green:
+            if layer:
+                with self._phase("layer_venv", package):
+                    layer = self._layer_venv(layer, args.upgrade)
+            self._staged[package] = self._generation_dir_path(package)
+            try:
+                scripts = self._install_venv(
+                    package, version, args, system, with_pip, lock, launchers, layer
+                )
+            except Exception:
+                if Path(self._staged[package]).exists():
+                    rmtree(self._staged[package])
+                raise
+            finally:
+                venv_dir = self._staged.pop(package)
+            with self._phase("unlink_scripts", package):
+                self._unlink_scripts(package, keep=scripts)
+            with self._phase("switch_venv", package):
+                previous = self._switch_venv(package, venv_dir)
+                self._generations_gc(package, [venv_dir, previous])
+        else:
+            scripts = self._install_venv(
+                package, version, args, system, with_pip, launchers=launchers
+            )
+        with self._phase("update_index", package):
+            self._update_index(package, scripts, launchers)
         print(f"Successfully {state} {package}{version}")
 
-        return cmd
+        return scripts
+
+    def which(self, args: list, **kwargs: dict) -> str:
+        """show the package owning a script"""
+
+        target, package = self._bin_links().get(args.script, (None, None))
+        if package is None:
+            raise Exception(f"Script '{args.script}' is not linked by pipis")
+        print(f"{args.script} -> {target} ({package})")
+
+        return package
+
+    def compile(self, args: list, **kwargs: dict) -> list:
+        """precompile the bytecode of venvs"""
+
+        if getattr(args, "all", False):
+            packages = self._venvs_list()
+        else:
+            packages = [self._normalize_name(x) for x in args.package or []]
+        if not packages:
+            raise Exception("A package or --all is required")
+
+        def compile_venv(package):
+            with self._venv_lock(package):
+                if not Path(self._venv_dir_path(package)).is_dir():
+                    raise Exception(f"Package {package} is not installed")
+                if not self._compile_venv(package, getattr(args, "optimize", None)):
+                    print(
+                        f"Some files of {package} cannot be compiled", file=sys.stderr
+                    )
+                print(f"Successfully compiled {package}")
+
+        results = self._run_jobs(compile_venv, packages, getattr(args, "jobs", 1))
+        errors = sorted(p for p, r in results.items() if isinstance(r, Exception))
+        for package in errors:
+            print(f"Cannot compile {package}: {results[package]}", file=sys.stderr)
+        if errors:
+            raise Exception(f"Cannot compile {', '.join(errors)}")
+
+        return sorted(packages)
+
+    def dedupe(self, args: list, **kwargs: dict) -> int:
+        """hardlink identical files across venvs"""
+
+        packages = getattr(args, "package", None) or self._venvs_list()
+        if isinstance(packages, str):
+            packages = [packages]
+        packages = [self._normalize_name(package) for package in packages]
+
+        def dedupe_venv(package):
+            with self._venv_lock(package):
+                return self._dedupe_venv(package)
+
+        results = self._run_jobs(dedupe_venv, packages, getattr(args, "jobs", 1))
+        for package in sorted(results):
+            if isinstance(results[package], Exception):
+                print(f"Cannot dedupe {package}: {results[package]}", file=sys.stderr)
+        reclaimed = sum(r for r in results.values() if isinstance(r, int))
+        reclaimed += self._store_gc()
+        print(f"Reclaimed {self._format_size(reclaimed)} in {len(packages)} venv(s)")
+
+        return reclaimed
+
+    def cache(self, args: list, **kwargs: dict) -> dict:
+        """inspect or prune the shared wheels cache"""
+
+        action = getattr(args, "action", None) or "info"
+        if action == "prune":
+            max_size = self._parse_size(getattr(args, "max_size", None) or 0)
+            removed = self._cache_evict(max_size)
+            print(f"Removed {len(removed)} wheel(s)")
+            removed = self._resolutions_evict()
+            print(f"Removed {len(removed)} expired resolution(s)")
+            removed = self._layers_gc()
+            print(f"Removed {len(removed)} unused layer(s)")
+        wheels = self._cache_wheels()
+        if action == "list":
+            for name in sorted(wheels):
+                size = self._format_size(wheels[name]["size"])
+                print(f"{name} ({size}) sha256={wheels[name]['sha256']}")
+        size = self._format_size(sum(w["size"] for w in wheels.values()))
+        print(f"{self._data_dir_path('wheels')}: {len(wheels)} wheel(s), {size}")
+        resolutions = len(list(Path(self._data_dir_path("resolutions")).glob("*.lock")))
+        stats = self._resolutions_stats()
+        hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+        hit_rate = 100 * hits / (hits + misses) if hits + misses else 0
+        print(
+            f"{self._data_dir_path('resolutions')}: {resolutions} resolution(s),"
+            f" {hits} hit(s), {misses} miss(es), {hit_rate:.0f}% hit rate"
+        )
+        layers = Path(self._data_dir_path("layers"))
+        versions = [
+            version
+            for key in (layers.iterdir() if layers.is_dir() else [])
+            for version in self._layer_versions(key.name)
+        ]
+        print(f"{layers}: {len(versions)} layer(s)")
+
+        return wheels
+
+    def _bundle_wheels(self, package: str, lock: str) -> list:
+        """Lock a package venv to the cached wheels of its closure.
+
+        Wheels missing from the cache, evicted or installed before the cache
+        existed, are built again first.
+
+        :param package: Package name
+        :type package: str
+        :param lock: Lock file path
+        :type lock: str
+        :raises Exception: When a wheel of the closure cannot be built
+        :return: Wheels file names
+        :rtype: list
+        """
+
+        from subprocess import CalledProcessError
+        import tempfile
+
+        wheelhouse = self._data_dir_path("wheels")
+        Path(wheelhouse).mkdir(parents=True, exist_ok=True)
+        pins = self._closure_wheels(package)
+        missing = [
+            f"{name}=={version}"
+            for name, version, wheel in pins
+            if not wheel or not Path(wheelhouse, wheel).is_file()
+        ]
+        if missing:
+            wheel_dir = tempfile.mkdtemp(dir=self._data_dir_path())
+            try:
+                cmd = self._pip_cmd(package) + ["wheel", "--quiet", "--no-deps"]
+                cmd += ["--wheel-dir", wheel_dir, "--find-links", wheelhouse]
+                with self._phase("pip_wheel", package):
+                    self._run(cmd + missing, package=package)
+                with self._phase("cache_add", package):
+                    self._cache_add(wheel_dir)
+            except CalledProcessError:
+                raise Exception(f"Cannot build {', '.join(missing)}")
+            finally:
+                rmtree(wheel_dir)
+            pins = self._closure_wheels(package)
+        missing = [f"{name}=={version}" for name, version, wheel in pins if not wheel]
+        if missing:
+            raise Exception(f"No wheel of {', '.join(missing)}")
+        self._write_lock(package, lock)
+
+        return [wheel for _, _, wheel in pins]
+
+    def _bundle_export(self, args: list) -> dict:
+        """Export the installed packages, their lock files and their wheels.
+
+        The bundle is an uncompressed tar archive, wheels being already compressed,
+        written aside and then renamed into place.
+
+        :param args: Command line arguments
+        :type args: list
+        :raises Exception: When packages closures cannot be bundled
+        :return: Bundle manifest
+        :rtype: dict
+        """
 
-    def update(self, args: list, **kwargs: dict) -> list:
+        import io
+        import sysconfig
+        import tarfile
+        import tempfile
+
+        import pkg_resources
+
+        index = self._installed_packages()
+        Path(self._data_dir_path()).mkdir(parents=True, exist_ok=True)
+        bundle_dir = tempfile.mkdtemp(dir=self._data_dir_path())
+        bundle_tmp = f"{args.file}.{os.getpid()}.tmp"
+        try:
+
+            def bundle_wheels(package):
+                lock = str(Path(bundle_dir, f"{package}.lock"))
+                with self._phase("bundle_wheels", package):
+                    return self._bundle_wheels(package, lock)
+
+            jobs = getattr(args, "jobs", 1)
+            results = self._run_jobs(bundle_wheels, sorted(index), jobs)
+            errors = sorted(p for p, r in results.items() if isinstance(r, Exception))
+            for package in errors:
+                print(f"Cannot export {package}: {results[package]}", file=sys.stderr)
+            if errors:
+                raise Exception(f"Cannot export {', '.join(errors)}")
+
+            # seed the template venv of the restoring host
+            wheels = set().union(*results.values())
+            seeds = {}
+            for name in self._cache_wheels():
+                project, version = name.split("-")[:2]
+                if safe_name(project) in ("pip", "wheel"):
+                    seeds.setdefault(safe_name(project), []).append(
+                        (pkg_resources.parse_version(version), name)
+                    )
+            wheels.update(max(versions)[1] for versions in seeds.values())
+            wheelhouse = self._data_dir_path("wheels")
+            wheels = {w for w in wheels if Path(wheelhouse, w).is_file()}
+
+            manifest = {
+                "pipis": __version__,
+                "created": time.time(),
+                "python": sys.implementation.cache_tag,
+                "platform": sysconfig.get_platform(),
+                "packages": {},
+                "wheels": sorted(wheels),
+            }
+            for package, entry in sorted(index.items()):
+                venv_config = self._venv_config(package)
+                manifest["packages"][package] = {
+                    "requirement": f"{package}=={entry['version']}",
+                    "dependencies": sorted(self._venv_dependencies(package)),
+                    "system": venv_config.get("include-system-site-packages") == "true",
+                    "no_pip": not self._venv_has_pip(package),
+                    "launchers": entry.get("launchers", False),
+                }
+
+            with self._phase("write_bundle"), self._wheels_lock(
+                shared=True
+            ), tarfile.open(bundle_tmp, "w") as tar:
+                data = json.dumps(manifest, indent=2).encode("utf-8")
+                info = tarfile.TarInfo("manifest.json")
+                info.size, info.mtime = len(data), manifest["created"]
+                tar.addfile(info, io.BytesIO(data))
+                for package in sorted(index):
+                    lock = str(Path(bundle_dir, f"{package}.lock"))
+                    tar.add(lock, arcname=f"locks/{package}.lock")
+                for wheel in manifest["wheels"]:
+                    tar.add(str(Path(wheelhouse, wheel)), arcname=f"wheels/{wheel}")
+            os.replace(bundle_tmp, args.file)
+        finally:
+            rmtree(bundle_dir)
+            if Path(bundle_tmp).exists():
+                os.remove(bundle_tmp)
+        print(
+            f"Successfully exported {len(index)} package(s)"
+            f" and {len(wheels)} wheel(s) to {args.file}"
+        )
+
+        return manifest
+
+    def _bundle_extract(self, path: str, bundle_dir: str) -> dict:
+        """Extract the manifest, lock files and wheels of a bundle.
+
+        Other members are ignored and files are written by their base name only,
+        so that an archive cannot write outside of the extraction directory.
+
+        :param path: Bundle file path
+        :type path: str
+        :param bundle_dir: Extraction directory
+        :type bundle_dir: str
+        :raises Exception: When the file is not a bundle
+        :return: Bundle manifest
+        :rtype: dict
+        """
+
+        from shutil import copyfileobj
+        import tarfile
+
+        manifest = None
+        try:
+            with tarfile.open(path) as tar:
+                for member in tar:
+                    parent, _, name = member.name.partition("/")
+                    if not member.isfile():
+                        continue
+                    if member.name == "manifest.json":
+                        manifest = json.load(tar.extractfile(member))
+                    elif (
+                        parent in ("locks", "wheels")
+                        and name
+                        and "/" not in name
+                        and not name.startswith(".")
+                    ):
+                        Path(bundle_dir, parent).mkdir(exist_ok=True)
+                        with tar.extractfile(member) as src, open(
+                            str(Path(bundle_dir, parent, name)), "wb"
+                        ) as dst:
+                            copyfileobj(src, dst)
+        except (tarfile.TarError, ValueError):
+            manifest = None
+        if not isinstance(manifest, dict) or "packages" not in manifest:
+            raise Exception(f"{path} is not a pipis bundle")
+
+        return manifest
+
+    def _bundle_restore(self, args: list) -> dict:
+        """Restore the packages of a bundle, from its wheels only.
+
+        :param args: Command line arguments
+        :type args: list
+        :raises Exception: When packages cannot be restored
+        :return: Action by package name
+        :rtype: dict
+        """
+
+        import sysconfig
+        import tempfile
+
+        wheelhouse = self._data_dir_path("wheels")
+        Path(wheelhouse).mkdir(parents=True, exist_ok=True)
+        bundle_dir = tempfile.mkdtemp(dir=self._data_dir_path())
+        try:
+            with self._phase("extract_bundle"):
+                manifest = self._bundle_extract(args.file, bundle_dir)
+            host = (sys.implementation.cache_tag, sysconfig.get_platform())
+            if (manifest.get("python"), manifest.get("platform")) != host:
+                print(
+                    f"Bundle was exported for {manifest.get('python')}"
+                    f" on {manifest.get('platform')}, some wheels may not install",
+                    file=sys.stderr,
+                )
+            desired = manifest["packages"]
+            with self._phase("sync_plan"):
+                plan = self._sync_plan(desired, uninstall=False)
+            if not plan:
+                print("All packages are restored")
+                return plan
+            if not args.yes:
+                self._confirm_plan(plan)
+            with self._phase("cache_add"):
+                self._cache_add(str(Path(bundle_dir, "wheels")))
+            locks = {p: str(Path(bundle_dir, "locks", f"{p}.lock")) for p in plan}
+            offline, self.offline = self.offline, True
+            try:
+                results = self._apply_plan(desired, plan, args, locks)
+            finally:
+                self.offline = offline
+        finally:
+            rmtree(bundle_dir)
+        with self._phase("cache_evict"):
+            self._cache_evict(CACHE_MAX_SIZE)
+        errors = sorted(p for p, r in results.items() if isinstance(r, Exception))
+        for package in errors:
+            print(f"Cannot restore {package}: {results[package]}", file=sys.stderr)
+        if errors:
+            raise Exception(f"Cannot restore {', '.join(errors)}")
+
+        return plan
+
+    def bundle(self, args: list, **kwargs: dict) -> dict:
+        """export the installed packages with their wheels, or restore them offline"""
+
+        if args.action == "export":
+            return self._bundle_export(args)
+
+        return self._bundle_restore(args)
+
+    def install(self, args: list, **kwargs: dict) -> dict:
+        """install packages"""
+
+        packages = self._packages_list(args)
+        if getattr(args, "lock", None) and len(packages) > 1:
+            raise Exception("A lock file can only install a single package")
+        state = "installed" if not args.upgrade else "updated"
+        if not args.yes:
+            if len(packages) == 1:
+                self._confirm(f"Package '{packages[0]}' will be {state}.")
+            else:
+                self._confirm(f"Packages '{', '.join(packages)}' will be {state}.")
+
+        def install_package(package):
+            name = self._normalize_name(package)
+            with self._phase("install_package", package), self._venv_lock(name):
+                return self._install_package(package, args)
+
+        # a single package is installed in the foreground, errors are raised as is
+        if len(packages) == 1:
+            return {packages[0]: install_package(packages[0])}
+
+        results = self._run_jobs(install_package, packages, getattr(args, "jobs", 1))
+        errors = sorted(p for p, r in results.items() if isinstance(r, Exception))
+        for package in errors:
+            print(f"Cannot install {package}: {results[package]}", file=sys.stderr)
+        if errors:
+            raise Exception(f"Cannot install {', '.join(errors)}")
+
+        return results
+
+    def update(self, args: list, **kwargs: dict) -> dict:
         """update packages"""
 
         # set defaults value to args
@@ -466,10 +3088,109 @@ class Pipis:
         args.dependency = None
         args.ignore_installed = False
         args.system = False
+        args.no_pip = False
+        args.lock = None
+        args.layer = None
+        # only upgrade outdated packages
+        if getattr(args, "all", False):
+            jobs = getattr(args, "jobs", 1)
+            with self._phase("outdated_packages"):
+                args.package = self._outdated_packages(self._venvs_list(), jobs)
+            if not args.package:
+                print("All packages are up to date")
+                return {}
         # run update
-        cmd = self.install(args)
+        results = self.install(args)
 
-        return cmd
+        return results
+
+    def _confirm_plan(self, plan: dict):
+        """Ask for confirmation of a sync plan.
+
+        :param plan: Action by package name
+        :type plan: dict
+        """
+
+        states = {"install": "installed", "update": "updated"}
+        states["uninstall"] = "uninstalled"
+        self._confirm(
+            "\n".join(
+                f"Package '{package}' will be {states[action]}."
+                for package, action in sorted(plan.items())
+            )
+        )
+
+    def _apply_plan(
+        self, desired: dict, plan: dict, args: list, locks: dict = None
+    ) -> dict:
+        """Apply a sync plan, packages are processed concurrently.
+
+        :param desired: Desired state by package name
+        :type desired: dict
+        :param plan: Action by package name
+        :type plan: dict
+        :param args: Command line arguments
+        :type args: list
+        :param locks: Lock files installed instead of resolving, by package name,
+            defaults to None
+        :type locks: dict, optional
+        :return: Results (or raised exception) by package name
+        :rtype: dict
+        """
+
+        from argparse import Namespace
+
+        def apply_package(package):
+            action = plan[package]
+            if action == "uninstall":
+                return self.uninstall(Namespace(package=package, yes=True))
+            state = desired[package]
+            # packages whose options only differ are rebuilt from their lock file
+            lock = str(Path(self._venv_dir_path(package), "requirements.lock"))
+            rebuild = (
+                action == "update"
+                and self._venv_dependencies(package) == set(state["dependencies"])
+                and self._locked(lock, package, state["requirement"])
+            )
+            if locks:
+                lock, rebuild = locks[package], True
+            package_args = Namespace(
+                upgrade=action == "update" and not rebuild,
+                lock=lock if rebuild else None,
+                dependency=state["dependencies"],
+                system=state["system"],
+                no_pip=state["no_pip"],
+                launchers=state["launchers"],
+                ignore_installed=False,
+                verbose=args.verbose,
+                dedupe=getattr(args, "dedupe", False),
+                keep_options=False,
+            )
+            with self._phase("install_package", package), self._venv_lock(package):
+                return self._install_package(state["requirement"], package_args)
+
+        return self._run_jobs(apply_package, sorted(plan), getattr(args, "jobs", 1))
+
+    def sync(self, args: list, **kwargs: dict) -> dict:
+        """install, update and uninstall packages to match a file"""
+
+        desired = self._sync_file(args.file)
+        with self._phase("sync_plan"):
+            plan = self._sync_plan(desired, not getattr(args, "keep", False))
+        if not plan:
+            print("All packages are in sync")
+            return plan
+        if not args.yes:
+            self._confirm_plan(plan)
+
+        results = self._apply_plan(desired, plan, args)
+        errors = sorted(p for p, r in results.items() if isinstance(r, Exception))
+        for package in errors:
+            print(f"Cannot sync {package}: {results[package]}", file=sys.stderr)
+        if errors:
+            raise Exception(f"Cannot sync {', '.join(errors)}")
+
+        return plan
 
     def uninstall(self, args: list, **kwargs: dict):
         """uninstall packages"""
@@ -477,19 +3198,50 @@ class Pipis:
         if not args.yes:
             self._confirm(f"Package '{args.package}' will be uninstalled.")
 
-        pipis_bin = self.config["bin"]
         package = self._normalize_name(args.package)
         venv_dir = self._venv_dir_path(package)
-        if Path(venv_dir).is_dir():
+        with self._venv_lock(package):
+            if not Path(venv_dir).is_dir():
+                print(f"Package {package} is not installed")
+                return
             # remove scripts symlink
-            scripts = self._package_scripts(package)
-            for script in scripts:
-                script_name = Path(script).name
-                target = Path(pipis_bin, script_name)
-                if target.is_symlink():
-                    target.unlink()
-            # remove package venv
-            rmtree(venv_dir)
+            with self._phase("unlink_scripts", package):
+                self._unlink_scripts(package)
+            # remove package venv, and its previous generations
+            with self._phase("remove_venv", package):
+                link = Path(self.config["venvs"], package)
+                if link.is_symlink():
+                    link.unlink()
+                rmtree(venv_dir)
+                self._generations_gc(package, [])
+            self._remove_index(package)
             print(f"Successfully uninstalled {package}")
-        else:
-            print(f"Package {package} is not installed")
+
+    def rollback(self, args: list, **kwargs: dict) -> str:
+        """switch packages back to their previous venv"""
+
+        package = self._normalize_name(args.package)
+        if not args.yes:
+            self._confirm(f"Package '{package}' will be rolled back.")
+
+        with self._venv_lock(package):
+            current_dir = self._venv_dir_path(package)
+            previous = [
+                x
+                for x in self._generations_list(package)
+                if os.path.realpath(x) != os.path.realpath(current_dir)
+            ]
+            if not Path(current_dir).is_dir() or not previous:
+                raise Exception(f"Package {package} has no previous venv")
+            self._staged[package] = previous[-1]
+            try:
+                scripts = self._create_link(package, True)
+                self._unlink_scripts(package, keep=scripts)
+                self._switch_venv(package, previous[-1])
+                version = self._package_version(package)
+            finally:
+                self._staged.pop(package, None)
+            self._update_index(package, scripts)
+        print(f"Successfully rolled back {package} to {version}")
+
+        return version
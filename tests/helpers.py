@@ -1,3 +1,4 @@
+import json
 import os
 
 
@@ -21,6 +22,18 @@ class Args:
         upgrade=False,
         ignore_installed=False,
         verbose=False,
+        requirement=None,
+        jobs=1,
+        no_pip=False,
+        dedupe=False,
+        refresh=False,
+        index=None,
+        file=None,
+        lock=None,
+        script=None,
+        optimize=None,
+        action=None,
+        layer=None,
     ):
         self.package = package
         self.query = query
@@ -30,3 +43,51 @@ class Args:
         self.upgrade = upgrade
         self.ignore_installed = ignore_installed
         self.verbose = verbose
+        self.requirement = requirement
+        self.jobs = jobs
+        self.no_pip = no_pip
+        self.dedupe = dedupe
+        self.refresh = refresh
+        self.index = index
+        self.file = file
+        self.lock = lock
+        self.script = script
+        self.optimize = optimize
+        self.action = action
+        self.layer = layer
+
+
+def make_venv(venvs, package="foo", version="1.0.0", scripts=("foo",)):
+    """Create a fake package venv, without network nor pip."""
+    venv_dir = venvs / package
+    venv_bin = venv_dir / "bin"
+    venv_site = venv_dir / "lib" / "python3.6" / "site-packages"
+    dist_info = venv_site / f"{package}-{version}.dist-info"
+    venv_bin.mkdir(parents=True)
+    dist_info.mkdir(parents=True)
+    (venv_dir / "pyvenv.cfg").write_text("version = 3.6.8\n")
+    (dist_info / "METADATA").write_text(f"Name: {package}\nVersion: {version}\n")
+    record = []
+    for script in scripts:
+        (venv_bin / script).write_text("#!/bin/sh\n")
+        (venv_bin / script).chmod(0o755)
+        record.append(f"../../../bin/{script},,")
+    (dist_info / "RECORD").write_text("\n".join(record))
+    return venv_dir
+
+
+def make_projects_dump(tmp_path):
+    """Create a JSON dump of an index projects, to search without network."""
+    dump = tmp_path / "projects.json"
+    dump.write_text(
+        json.dumps(
+            {
+                "projects": [
+                    {"name": "pipis", "summary": "Wrapper around pip and venv"},
+                    {"name": "pipx", "summary": "Install Python applications"},
+                    {"name": "requests", "summary": "Python HTTP for Humans."},
+                ]
+            }
+        )
+    )
+    return str(dump)
@@ -0,0 +1,58 @@
+import io
+import os
+import tarfile
+
+import pytest
+
+from helpers import Args, set_env
+from pipis.utils import Pipis
+
+
+def test_bundle_extract(tmp_path):
+    set_env(tmp_path)
+    bundle = tmp_path / "bundle.tar"
+    with tarfile.open(str(bundle), "w") as tar:
+        for name in ("manifest.json", "wheels/foo.whl", "wheels/../../evil", "x"):
+            data = b'{"packages": {}}' if name == "manifest.json" else b"data"
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    bundle_dir = tmp_path / "extract"
+    bundle_dir.mkdir()
+
+    manifest = Pipis()._bundle_extract(str(bundle), str(bundle_dir))
+
+    assert manifest == {"packages": {}}
+    assert sorted(os.listdir(str(bundle_dir / "wheels"))) == ["foo.whl"]
+    assert not (tmp_path / "evil").exists()
+
+    (tmp_path / "other.tar").write_text("not a tar")
+    with pytest.raises(Exception, match="is not a pipis bundle"):
+        Pipis()._bundle_extract(str(tmp_path / "other.tar"), str(bundle_dir))
+
+
+def test_bundle(tmp_path, capsys, monkeypatch):
+    set_env(tmp_path)
+    bundle = str(tmp_path / "bundle.tar")
+    p = Pipis()
+    p.install(Args(package="pipis==1.0.0"))
+
+    manifest = p.bundle(Args(action="export", file=bundle))
+
+    assert manifest["packages"]["pipis"]["requirement"] == "pipis==1.0.0"
+    assert any(w.startswith("pipis-1.0.0-") for w in manifest["wheels"])
+    with tarfile.open(bundle) as tar:
+        assert "locks/pipis.lock" in tar.getnames()
+
+    # restore with an empty cache and no index
+    p.uninstall(Args(package="pipis"))
+    p.cache(Args(action="prune"))
+    monkeypatch.setenv("PIP_INDEX_URL", "http://127.0.0.1:9/simple")
+    monkeypatch.delenv("PIP_EXTRA_INDEX_URL", raising=False)
+    plan = p.bundle(Args(action="restore", file=bundle))
+    captured = capsys.readouterr()
+
+    assert plan == {"pipis": "install"}
+    assert "Successfully installed pipis==1.0.0" in captured.out
+    assert p._package_version("pipis") == "1.0.0"
+    assert (tmp_path / "venvs" / "pipis" / "requirements.lock").is_file()
@@ -0,0 +1,55 @@
+import os
+import sys
+
+from helpers import set_env
+from pipis.__main__ import main
+
+
+def test_cache(tmp_path, capsys, monkeypatch):
+    set_env(tmp_path)
+    package = "pipis"
+    sys.argv = ["pipis", "install", "-y", package]
+    main()
+    sys.argv = ["pipis", "uninstall", "-y", package]
+    main()
+    capsys.readouterr()  # reset capture
+
+    # reinstall from the cache only
+    monkeypatch.setenv("PIP_INDEX_URL", "http://invalid.invalid/simple")
+    sys.argv = ["pipis", "install", "-y", package]
+    main()
+    sys.argv = ["pipis", "cache", "list"]
+    main()
+    captured = capsys.readouterr()
+
+    assert f"Successfully installed {package}" in captured.out
+    assert f"{package}-" in captured.out
+    assert "sha256=" in captured.out
+
+    sys.argv = ["pipis", "cache", "prune"]
+    main()
+    captured = capsys.readouterr()
+
+    assert "0 wheel(s), 0 B" in captured.out
+    assert not os.listdir(tmp_path / "venvs" / ".pipis" / "wheels")
+
+
+def test_cache_resolutions(tmp_path, capsys):
+    set_env(tmp_path)
+    package = "pipis==1.0.0"
+    sys.argv = ["pipis", "install", "-y", package]
+    main()
+    sys.argv = ["pipis", "uninstall", "-y", "pipis"]
+    main()
+    capsys.readouterr()  # reset capture
+
+    # the second install skips the resolution
+    sys.argv = ["pipis", "--timings", "install", "-y", package]
+    main()
+    sys.argv = ["pipis", "cache"]
+    main()
+    captured = capsys.readouterr()
+
+    assert f"Successfully installed {package}" in captured.out
+    assert "install_locked" in captured.err
+    assert "1 resolution(s), 1 hit(s), 1 miss(es), 50% hit rate" in captured.out
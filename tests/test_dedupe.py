@@ -0,0 +1,27 @@
+import sys
+
+from helpers import make_venv, set_env
+from pipis.__main__ import main
+
+
+def test_dedupe(tmp_path, capsys):
+    set_env(tmp_path)
+    venvs = tmp_path / "venvs"
+    for package in ("foo", "bar"):
+        venv_site = (
+            make_venv(venvs, package, scripts=[package])
+            / "lib"
+            / "python3.6"
+            / "site-packages"
+        )
+        (venv_site / "six.py").write_text("x" * 1000)
+
+    sys.argv = ["pipis", "dedupe"]
+    main()
+    captured = capsys.readouterr()
+    foo_six = venvs / "foo" / "lib" / "python3.6" / "site-packages" / "six.py"
+    bar_six = venvs / "bar" / "lib" / "python3.6" / "site-packages" / "six.py"
+
+    assert "Reclaimed 1000 B in 2 venv(s)" in captured.out
+    assert foo_six.stat().st_ino == bar_six.stat().st_ino
+    assert foo_six.read_text() == "x" * 1000
@@ -1,6 +1,7 @@
+import json
 import sys
 
-from helpers import set_env
+from helpers import make_venv, set_env
 from pipis.__main__ import main
 
 
@@ -16,3 +17,39 @@ def test_freeze(tmp_path, capsys):
     captured = capsys.readouterr()
 
     assert f"{package}==" in captured.out
+
+
+def test_freeze_formats(tmp_path, capsys):
+    set_env(tmp_path)
+    venvs = tmp_path / "venvs"
+    for package in ("foo", "bar", "baz"):
+        make_venv(venvs, package, "1.0.0", scripts=[package])
+
+    sys.argv = ["pipis", "freeze", "--format", "jsonl", "-j", "2"]
+    main()
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    assert [r["name"] for r in records] == ["bar", "baz", "foo"]
+    assert records[0]["version"] == "1.0.0"
+    assert records[0]["python"] == "3.6.8"
+    assert records[0]["scripts"] == [str((venvs / "bar" / "bin" / "bar").resolve())]
+    assert records[0]["size"] > 0
+
+    sys.argv = ["pipis", "freeze", "--format", "json"]
+    main()
+
+    assert json.loads(capsys.readouterr().out) == records
+
+    sys.argv = ["pipis", "freeze"]
+    main()
+
+    assert capsys.readouterr().out == "bar==1.0.0\nbaz==1.0.0\nfoo==1.0.0\n"
+
+
+def test_freeze_json_empty(tmp_path, capsys):
+    set_env(tmp_path)
+
+    sys.argv = ["pipis", "freeze", "--format", "json"]
+    main()
+
+    assert json.loads(capsys.readouterr().out) == []
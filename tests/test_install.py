@@ -1,3 +1,5 @@
+from pathlib import Path
+import re
 import sys
 
 from helpers import set_env
@@ -39,3 +41,118 @@ def test_install_dependency(tmp_path, capsys):
     captured = capsys.readouterr()
 
     assert f"Successfully installed {package}" in captured.out
+
+
+def test_install_dependencies(tmp_path, capsys):
+    set_env(tmp_path)
+
+    package = "pipis"
+    sys.argv = ["pipis", "--timings", "install", "-y", package]
+    sys.argv += ["-d", "flake8", "-d", "mccabe"]
+    main()
+    captured = capsys.readouterr()
+    requirements = tmp_path / "venvs" / package / "requirements.txt"
+
+    assert f"Successfully installed {package}" in captured.out
+    assert requirements.read_text() == "flake8\nmccabe"
+    # the package and its dependencies are installed by a single pip transaction
+    assert re.search(r"^install_main +1 ", captured.err, re.M)
+
+
+def test_install_multiple(tmp_path, capsys):
+    set_env(tmp_path)
+
+    packages = ["pipis", "flake8"]
+    sys.argv = ["pipis", "install", "-y", "-j", "2"] + packages
+    main()
+    captured = capsys.readouterr()
+
+    for package in packages:
+        assert f"Successfully installed {package}" in captured.out
+
+
+def test_install_requirement(tmp_path, capsys):
+    set_env(tmp_path)
+    requirement = tmp_path / "tools.txt"
+    requirement.write_text("# tools\npipis\n\nflake8\n")
+
+    sys.argv = ["pipis", "install", "-y", "-r", str(requirement)]
+    main()
+    captured = capsys.readouterr()
+
+    assert "Successfully installed pipis" in captured.out
+    assert "Successfully installed flake8" in captured.out
+
+
+def test_install_locked(tmp_path, capsys):
+    set_env(tmp_path)
+    lock = tmp_path / "venvs" / "pipis" / "requirements.lock"
+
+    sys.argv = ["pipis", "install", "-y", "pipis==1.0.0"]
+    main()
+
+    assert "pipis==1.0.0 --hash=sha256:" in lock.read_text()
+
+    # reinstall from the lock file of the current venv
+    sys.argv = ["pipis", "--timings", "install", "-y", "-I", "pipis"]
+    main()
+    captured = capsys.readouterr()
+
+    assert "Successfully installed pipis" in captured.out
+    assert "install_locked" in captured.err
+
+    # install from a copied lock file
+    copied = Path(tmp_path, "pipis.lock")
+    copied.write_text(lock.read_text())
+    sys.argv = ["pipis", "uninstall", "-y", "pipis"]
+    main()
+    sys.argv = ["pipis", "install", "-y", "--lock", str(copied), "pipis"]
+    main()
+    sys.argv = ["pipis", "freeze"]
+    main()
+    captured = capsys.readouterr()
+
+    assert "pipis==1.0.0" in captured.out
+
+
+def test_install_no_pip_resolution(tmp_path, capsys):
+    set_env(tmp_path)
+    venvs = tmp_path / "venvs"
+
+    # setuptools is required, but left out of the lock of a seeded venv
+    sys.argv = ["pipis", "install", "-y", "setuptools-scm"]
+    main()
+    sys.argv = ["pipis", "uninstall", "-y", "setuptools-scm"]
+    main()
+    capsys.readouterr()  # reset capture
+    sys.argv = ["pipis", "--timings", "install", "-y", "--no-pip", "setuptools-scm"]
+    main()
+    captured = capsys.readouterr()
+    venv_site = next(venvs.glob("setuptools-scm/lib/python*/site-packages"))
+
+    assert "install_locked" not in captured.err
+    assert list(venv_site.glob("setuptools-*.dist-info"))
+
+
+def test_install_layer(tmp_path, capsys):
+    set_env(tmp_path)
+    venvs = tmp_path / "venvs"
+
+    sys.argv = ["pipis", "install", "-y", "--layer", "pyflakes", "flake8"]
+    main()
+    sys.argv = ["pipis", "install", "-y", "--layer", "pyflakes", "pyflakes"]
+    main()
+    captured = capsys.readouterr()
+    flake8_site = next(venvs.glob("flake8/lib/python*/site-packages"))
+    pyflakes_site = next(venvs.glob("pyflakes/lib/python*/site-packages"))
+    layer = (flake8_site / "pipis-layer.pth").read_text().strip()
+
+    assert "Successfully installed flake8" in captured.out
+    assert layer.startswith(str(venvs / ".pipis" / "layers"))
+    assert list(Path(layer).glob("pyflakes-*.dist-info"))
+    assert not list(flake8_site.glob("pyflakes-*.dist-info"))
+    assert "pyflakes==" in (venvs / "flake8" / "requirements.lock").read_text()
+    # a package provided by its own layer gets its own copy
+    assert "Successfully installed pyflakes" in captured.out
+    assert not (pyflakes_site / "pipis-layer.pth").exists()
+    assert list(pyflakes_site.glob("pyflakes-*.dist-info"))
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from helpers import Args, make_venv, set_env
+from pipis.lock import LockTimeout, file_lock
+from pipis.utils import Pipis
+
+
+def test_file_lock(tmp_path):
+    lock_path = str(tmp_path / "locks" / "foo.lock")
+
+    with file_lock(lock_path):
+        with pytest.raises(LockTimeout, match="Package 'foo' is locked"):
+            with file_lock(lock_path, timeout=0, description="Package 'foo'"):
+                pass
+    # released
+    with file_lock(lock_path, timeout=0):
+        pass
+
+
+def test_file_lock_shared(tmp_path):
+    lock_path = str(tmp_path / "locks" / "cache.lock")
+
+    with file_lock(lock_path, shared=True):
+        with file_lock(lock_path, timeout=0, shared=True):
+            pass
+        with pytest.raises(LockTimeout):
+            with file_lock(lock_path, timeout=0):
+                pass
+
+
+def test_uninstall_locked(tmp_path):
+    set_env(tmp_path)
+    make_venv(tmp_path / "venvs", "foo")
+
+    p = Pipis()
+    p.lock_timeout = 0.1
+    with p._venv_lock("foo"):
+        with pytest.raises(LockTimeout):
+            p.uninstall(Args(package="foo"))
+
+    assert (tmp_path / "venvs" / "foo").is_dir()
+
+
+def test_install_locked(tmp_path):
+    set_env(tmp_path)
+
+    p = Pipis()
+    p.lock_timeout = 0.1
+    with p._venv_lock("black"):
+        for package in ("Black==22.1.0", "black>=22"):
+            with pytest.raises(LockTimeout):
+                p.install(Args(package=package))
+
+    assert not (tmp_path / "venvs" / "Black").exists()
+    assert sorted(os.listdir(p._data_dir_path("locks"))) == ["venv-black.lock"]
+
+
+def test_uninstall_claimed_link(tmp_path):
+    set_env(tmp_path)
+    foo_dir = make_venv(tmp_path / "venvs", "foo", scripts=["tool"])
+    bar_dir = make_venv(tmp_path / "venvs", "bar", scripts=["tool"])
+    link = tmp_path / "bin" / "tool"
+    # "tool" was first installed by foo, then claimed by bar
+    link.symlink_to(bar_dir / "bin" / "tool")
+
+    p = Pipis()
+    p.uninstall(Args(package="foo"))
+
+    assert not foo_dir.exists()
+    assert link.resolve() == (bar_dir / "bin" / "tool").resolve()
@@ -0,0 +1,82 @@
+import pytest
+
+from pipis.metadata import DistributionNotFound, find_distribution, safe_name
+
+
+def make_dist(site, name="Foo_Bar", version="1.2.3"):
+    dist_info = site / f"{name}-{version}.dist-info"
+    dist_info.mkdir(parents=True)
+    (dist_info / "METADATA").write_text(
+        f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n\nName: nope\n"
+    )
+    (dist_info / "RECORD").write_text("../../../bin/foo,,\nfoo/__init__.py,,\n")
+    (dist_info / "entry_points.txt").write_text(
+        "[console_scripts]\nfoo = foo.cli:main\nfoo-bar = foo.cli:bar\n"
+    )
+    return dist_info
+
+
+def test_safe_name():
+    assert safe_name("Foo_Bar.baz") == "foo-bar-baz"
+
+
+def test_find_distribution(tmp_path):
+    site = tmp_path / "site-packages"
+    dist_info = make_dist(site)
+
+    dist = find_distribution([str(tmp_path / "missing"), str(site)], "foo-bar")
+
+    assert dist.location == str(site)
+    assert dist.egg_info == str(dist_info)
+    assert dist.project_name == "Foo_Bar"
+    assert dist.version == "1.2.3"
+    assert dist.has_metadata("RECORD")
+    assert not dist.has_metadata("installed-files.txt")
+    assert list(dist.get_metadata_lines("RECORD"))[0] == "../../../bin/foo,,"
+    assert dist.get_entry_map("console_scripts") == {
+        "foo": "foo.cli:main",
+        "foo-bar": "foo.cli:bar",
+    }
+
+
+def test_find_distribution_egg_info(tmp_path):
+    site = tmp_path / "site-packages"
+    egg_info = site / "foo.egg-info"
+    egg_info.mkdir(parents=True)
+    (egg_info / "PKG-INFO").write_text("Name: foo\nVersion: 0.1\n")
+
+    dist = find_distribution([str(site)], "Foo")
+
+    assert dist.version == "0.1"
+    assert dist.get_entry_map() == {}
+
+
+def test_find_distribution_not_found(tmp_path):
+    site = tmp_path / "site-packages"
+    make_dist(site)
+
+    with pytest.raises(DistributionNotFound):
+        find_distribution([str(site)], "foo")
+
+
+def test_requires(tmp_path):
+    site = tmp_path / "site-packages"
+    dist_info = make_dist(site)
+    (dist_info / "METADATA").write_text(
+        "Name: Foo_Bar\nRequires-Dist: bar>=1\n"
+        'Requires-Dist: baz; extra == "x"\n\nRequires-Dist: nope\n'
+    )
+    egg_info = site / "qux.egg-info"
+    egg_info.mkdir()
+    (egg_info / "PKG-INFO").write_text("Name: qux\nVersion: 0.1\n")
+    (egg_info / "requires.txt").write_text("bar\n\n[x]\nbaz\n[:os_name == 'nt']\nwin\n")
+
+    assert find_distribution([str(site)], "foo-bar").requires() == [
+        "bar>=1",
+        'baz; extra == "x"',
+    ]
+    assert find_distribution([str(site)], "qux").requires() == [
+        "bar",
+        'baz; extra == "x"',
+        "win; (os_name == 'nt')",
+    ]
@@ -0,0 +1,39 @@
+import re
+
+from pipis.pypi import filename_version, latest_version, project_list
+
+
+def test_filename_version():
+    assert filename_version("pipis-2.0.0-py3-none-any.whl") == "2.0.0"
+    assert filename_version("pipis-2.0.0.post2.tar.gz") == "2.0.0.post2"
+    assert filename_version("pipis-1.0.0-py3.6.egg") == ""
+
+
+def test_latest_version():
+    version = latest_version("pipis")
+
+    assert re.match(r"^\d+(?:\.\d+){1,3}", version)
+    assert latest_version("pipis") == latest_version("PIPIS")
+
+
+def test_project_list_dump(tmp_path):
+    dump = tmp_path / "projects.json"
+    dump.write_text(
+        '{"projects": [{"name": "pipis", "summary": "pip install isolated"},'
+        ' {"name": "Foo"}]}'
+    )
+
+    assert project_list(str(dump)) == (
+        {"pipis": "pip install isolated", "Foo": ""},
+        None,
+    )
+
+
+def test_project_list_mirror(tmp_path):
+    (tmp_path / "simple" / "pipis").mkdir(parents=True)
+    (tmp_path / "simple" / "foo_bar-1.0-py3-none-any.whl").write_text("")
+    (tmp_path / "simple" / "baz-qux-2.0.tar.gz").write_text("")
+
+    projects, _ = project_list(str(tmp_path))
+
+    assert projects == {"pipis": "", "foo_bar": "", "baz-qux": ""}
@@ -0,0 +1,96 @@
+import asyncio
+import io
+import json
+import subprocess
+import sys
+import time
+
+import pytest
+
+from pipis.runner import _run_threaded, run, run_async
+from pipis.utils import Pipis
+
+SCRIPT = "import sys; print('out 1'); print('err', file=sys.stderr); print('out 2')"
+
+
+def test_run_lines():
+    lines = []
+    output = run([sys.executable, "-c", SCRIPT], lambda *line: lines.append(line))
+
+    assert output is None
+    assert ("stdout", "out 1") in lines
+    assert ("stdout", "out 2") in lines
+    assert ("stderr", "err") in lines
+
+
+def test_run_capture():
+    lines = []
+    output = run(
+        [sys.executable, "-c", SCRIPT], lambda *line: lines.append(line), capture=True
+    )
+
+    assert output == b"out 1\nout 2\n"
+    assert lines == [("stderr", "err")]
+
+
+def test_run_fail():
+    with pytest.raises(subprocess.CalledProcessError):
+        run([sys.executable, "-c", "exit(3)"])
+
+
+def test_run_timeout():
+    start = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        run([sys.executable, "-c", "import time; time.sleep(30)"], timeout=0.5)
+
+    assert time.monotonic() - start < 10
+
+
+@pytest.mark.skipif(
+    sys.version_info < (3, 8), reason="asyncio subprocesses need a child watcher"
+)
+def test_run_async_concurrent():
+    async def run_all():
+        cmd = [sys.executable, "-c", "import time; time.sleep(1)"]
+        await asyncio.gather(*[run_async(cmd) for _ in range(4)])
+
+    start = time.monotonic()
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(run_all())
+    finally:
+        loop.close()
+
+    assert time.monotonic() - start < 4
+
+
+def test_pipis_run_log(capsys):
+    p = Pipis(config={"venvs": "venvs", "bin": "bin"})
+    p.log = io.StringIO()
+    p._run([sys.executable, "-c", SCRIPT], package="foo")
+    captured = capsys.readouterr()
+    records = [json.loads(line) for line in p.log.getvalue().splitlines()]
+
+    assert captured.out == "foo: out 1\nfoo: out 2\n"
+    assert captured.err == "foo: err\n"
+    assert {(r["package"], r["stream"], r["line"]) for r in records} == {
+        ("foo", "stdout", "out 1"),
+        ("foo", "stderr", "err"),
+        ("foo", "stdout", "out 2"),
+    }
+
+
+def test_run_threaded():
+    lines = []
+    output = _run_threaded(
+        [sys.executable, "-c", SCRIPT], lambda *line: lines.append(line), capture=True
+    )
+
+    assert output == b"out 1\nout 2\n"
+    assert lines == [("stderr", "err")]
+    with pytest.raises(subprocess.CalledProcessError):
+        _run_threaded([sys.executable, "-c", "exit(3)"])
+    with pytest.raises(subprocess.TimeoutExpired):
+        _run_threaded(
+            [sys.executable, "-c", "import time; time.sleep(30)"], timeout=0.5
+        )
@@ -1,18 +1,14 @@
 import sys
 
-from helpers import Args, set_env
+from helpers import make_projects_dump, set_env
 from pipis.__main__ import main
-from pipis.utils import Pipis
 
 
 def test_search(tmp_path, capsys):
     set_env(tmp_path)
-    p = Pipis()
-    args = Args()
-    p.install(args)
 
     package = "pipis"
-    sys.argv = ["pipis", "search", package]
+    sys.argv = ["pipis", "search", package, "--index", make_projects_dump(tmp_path)]
     main()
     captured = capsys.readouterr()
 
@@ -22,14 +18,20 @@ def test_search(tmp_path, capsys):
 
 def test_search_inexistant(tmp_path, capsys):
     set_env(tmp_path)
-    p = Pipis()
-    args = Args()
-    p.install(args)
-    capsys.readouterr()  # reset capture
 
     package = "pipistache"
-    sys.argv = ["pipis", "search", package]
+    sys.argv = ["pipis", "search", package, "--index", make_projects_dump(tmp_path)]
     main()
     captured = capsys.readouterr()
 
     assert captured.out == f"Package '{package}' not found\n"
+
+
+def test_search_refresh(tmp_path, capsys):
+    set_env(tmp_path)
+
+    sys.argv = ["pipis", "search", "--refresh", "--index", make_projects_dump(tmp_path)]
+    main()
+    captured = capsys.readouterr()
+
+    assert captured.out == "Search index refreshed, 3 projects\n"
@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from helpers import set_env
+
+HEAVY_MODULES = ["pkg_resources", "venv", "subprocess", "urllib.request", "ctypes"]
+
+
+@pytest.mark.parametrize("command", [["-h"], ["version"], ["freeze"]])
+def test_startup_imports(tmp_path, command):
+    set_env(tmp_path)
+    cmd = [sys.executable, "-X", "importtime", "-m", "pipis"] + command
+    proc = subprocess.run(
+        cmd, env=os.environ, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    modules = [
+        line.split("|")[-1].strip() for line in proc.stderr.decode().splitlines()
+    ]
+
+    assert proc.returncode == 0
+    for module in HEAVY_MODULES:
+        assert module not in modules
@@ -0,0 +1,120 @@
+import sys
+
+import pytest
+
+from helpers import Args, make_venv, set_env
+from pipis.__main__ import main
+from pipis.utils import Pipis
+
+
+def test_sync_file(tmp_path):
+    set_env(tmp_path)
+    state = tmp_path / "tools.txt"
+    state.write_text(
+        "# tools\n"
+        "foo==1.0.0\n"
+        "\n"
+        "bar -d baz --dependency 'qux>=1' --system  # comment\n"
+        "pipis --no-pip --launchers\n"
+    )
+
+    p = Pipis()
+    desired = p._sync_file(str(state))
+
+    assert desired["foo"]["requirement"] == "foo==1.0.0"
+    assert desired["bar"]["dependencies"] == ["baz", "qux>=1"]
+    assert desired["bar"]["system"]
+    assert desired["pipis"]["no_pip"]
+    assert desired["pipis"]["launchers"]
+    assert not desired["foo"]["launchers"]
+
+    state.write_text("foo --upgrade\n")
+    with pytest.raises(Exception, match="Unknown option '--upgrade'"):
+        p._sync_file(str(state))
+    for line in ("foo -d\n", "foo --dependency ''\n", "foo -d --system\n"):
+        state.write_text(line)
+        with pytest.raises(Exception, match="Missing value of option"):
+            p._sync_file(str(state))
+
+
+def test_sync_plan(tmp_path):
+    set_env(tmp_path)
+    venvs = tmp_path / "venvs"
+    for package in ("foo", "bar", "baz"):
+        make_venv(venvs, package, "1.0.0", scripts=[package])
+
+    p = Pipis()
+    desired = {
+        package: {
+            "requirement": requirement,
+            "dependencies": [],
+            "system": False,
+            "no_pip": True,
+            "launchers": False,
+        }
+        for package, requirement in [
+            ("foo", "foo==1.0.0"),
+            ("bar", "bar>=2"),
+            ("qux", "qux"),
+        ]
+    }
+
+    assert p._sync_plan(desired) == {
+        "bar": "update",
+        "qux": "install",
+        "baz": "uninstall",
+    }
+    assert p._sync_plan(desired, uninstall=False) == {
+        "bar": "update",
+        "qux": "install",
+    }
+    desired["foo"]["dependencies"] = ["six"]
+    assert p._sync_plan(desired)["foo"] == "update"
+    desired["foo"]["dependencies"] = []
+    desired["foo"]["launchers"] = True
+    assert p._sync_plan(desired)["foo"] == "update"
+
+
+def test_sync_plan_own_venv(tmp_path, monkeypatch):
+    set_env(tmp_path)
+    venvs = tmp_path / "venvs"
+    for package in ("pipis", "foo", "bar"):
+        make_venv(venvs, package, "1.0.0", scripts=[package])
+    monkeypatch.setattr(sys, "prefix", str(venvs / "foo"))
+
+    p = Pipis()
+
+    assert p._sync_plan({}) == {"bar": "uninstall"}
+
+
+def test_sync_noop(tmp_path, capsys):
+    set_env(tmp_path)
+    venvs = tmp_path / "venvs"
+    for i in range(100):
+        make_venv(venvs, f"tool{i}", "1.0.0", scripts=[f"tool{i}"])
+    state = tmp_path / "tools.txt"
+    state.write_text("".join(f"tool{i}==1.0.0 --no-pip\n" for i in range(100)))
+
+    sys.argv = ["pipis", "sync", str(state)]
+    main()
+    captured = capsys.readouterr()
+
+    assert captured.out == "All packages are in sync\n"
+
+
+def test_sync(tmp_path, capsys):
+    set_env(tmp_path)
+    state = tmp_path / "tools.txt"
+    state.write_text("pipis==1.0.0\npyflakes\n")
+
+    p = Pipis()
+    p.sync(Args(file=str(state), jobs=2))
+    capsys.readouterr()  # reset capture
+
+    assert p._package_version("pipis") == "1.0.0"
+    assert p.sync(Args(file=str(state))) == {}
+
+    # pipis itself is never uninstalled
+    state.write_text("")
+    assert p.sync(Args(file=str(state))) == {"pyflakes": "uninstall"}
+    assert p._venvs_list() == ["pipis"]
@@ -0,0 +1,42 @@
+import json
+import sys
+
+from helpers import make_venv, set_env
+from pipis.__main__ import main
+from pipis.trace import Tracer
+
+
+def test_tracer():
+    tracer = Tracer()
+    with tracer.phase("outer", package="foo"):
+        with tracer.phase("inner"):
+            tracer.count_subprocess()
+            tracer.count_subprocess()
+
+    inner, outer = tracer.events
+    assert inner["name"] == "inner"
+    assert inner["subprocesses"] == 2
+    assert outer["name"] == "outer"
+    assert outer["subprocesses"] == 2
+    assert outer["args"] == {"package": "foo"}
+    assert outer["duration"] >= inner["duration"]
+    assert "inner" in tracer.summary()
+
+    trace = tracer.chrome_trace()
+    assert [e["name"] for e in trace["traceEvents"]] == ["inner", "outer"]
+    assert all(e["ph"] == "X" for e in trace["traceEvents"])
+
+
+def test_trace_cli(tmp_path, capsys):
+    set_env(tmp_path)
+    make_venv(tmp_path / "venvs", "foo")
+    trace_path = tmp_path / "trace.json"
+
+    sys.argv = ["pipis", "--timings", "--trace", str(trace_path), "freeze"]
+    main()
+    captured = capsys.readouterr()
+
+    assert "foo==1.0.0" in captured.out
+    assert "installed_packages" in captured.err
+    names = [e["name"] for e in json.loads(trace_path.read_text())["traceEvents"]]
+    assert names == ["installed_packages", "freeze"]
@@ -13,3 +13,43 @@ def test_update(tmp_path, capsys):
     captured = capsys.readouterr()
 
     assert f"Successfully updated {package}" in captured.out
+
+
+def test_update_all(tmp_path, capsys):
+    set_env(tmp_path)
+    sys.argv = ["pipis", "install", "-y", "pipis==1.0.0", "flake8"]
+    main()
+    capsys.readouterr()  # reset capture
+
+    sys.argv = ["pipis", "update", "-y", "--all"]
+    main()
+    captured = capsys.readouterr()
+
+    assert "Successfully updated pipis" in captured.out
+    assert "flake8" not in captured.out
+
+    sys.argv = ["pipis", "update", "-y", "--all"]
+    main()
+    captured = capsys.readouterr()
+
+    assert captured.out == "All packages are up to date\n"
+
+
+def test_update_rollback(tmp_path, capsys):
+    set_env(tmp_path)
+    sys.argv = ["pipis", "install", "-y", "pipis==1.0.0"]
+    main()
+    sys.argv = ["pipis", "update", "-y", "pipis"]
+    main()
+    link = tmp_path / "bin" / "pipis"
+    updated = link.resolve()
+    capsys.readouterr()  # reset capture
+
+    sys.argv = ["pipis", "rollback", "-y", "pipis"]
+    main()
+    captured = capsys.readouterr()
+
+    assert captured.out == "Successfully rolled back pipis to 1.0.0\n"
+    assert link.resolve() != updated
+    # the updated venv is kept to roll forward
+    assert updated.exists()
@@ -1,12 +1,13 @@
 import os
 from pathlib import Path
 import re
+from shutil import rmtree
 import sys
 
 import pytest
 from unittest import mock
 
-from helpers import Args, set_env
+from helpers import Args, make_projects_dump, make_venv, set_env
 from pipis.utils import Pipis
 
 
@@ -141,6 +142,38 @@ def test_venv_py_path(tmp_path):
     assert venv_py.startswith(str(tmp_path))
 
 
+def test_data_dir_path(tmp_path):
+    set_env(tmp_path)
+
+    p = Pipis()
+    data_dir = p._data_dir_path("index.json")
+
+    assert data_dir == str(tmp_path / "venvs" / ".pipis" / "index.json")
+
+
+def test_venvs_list(tmp_path):
+    set_env(tmp_path)
+    make_venv(tmp_path / "venvs", "foo")
+    make_venv(tmp_path / "venvs", "bar")
+    (tmp_path / "venvs" / ".pipis").mkdir()
+
+    p = Pipis()
+
+    assert p._venvs_list() == ["bar", "foo"]
+
+
+def test_venv_site_path(tmp_path):
+    set_env(tmp_path)
+
+    p = Pipis()
+    args = Args()
+    p._create_venv(package=args.package)
+    venv_site = p._venv_site_path(args.package)
+
+    assert Path(venv_site).is_dir()
+    assert venv_site.endswith("site-packages")
+
+
 def test_create_venv(tmp_path):
     set_env(tmp_path)
 
@@ -153,6 +186,24 @@ def test_create_venv(tmp_path):
     assert Path(venv_dir, "bin", "pip").exists()
 
 
+def test_create_venv_clone(tmp_path):
+    set_env(tmp_path)
+
+    p = Pipis()
+    template_dir = p._template_venv()
+    venv_dir = p._create_venv(package="hello", system=True)
+    venv_pip = Path(p._venv_site_path("hello"), "pip", "__init__.py")
+    template_pip = Path(template_dir, venv_pip.relative_to(venv_dir))
+
+    assert Path(template_dir, "bin", "pip").exists()
+    assert Path(venv_dir, "bin", "pip").read_text().startswith(f"#!{venv_dir}/")
+    assert "include-system-site-packages = true" in (
+        Path(venv_dir, "pyvenv.cfg").read_text()
+    )
+    assert venv_pip.stat().st_ino == template_pip.stat().st_ino
+    assert not Path(venv_dir, "pipis-template.json").exists()
+
+
 def test_dist_info(tmp_path):
     set_env(tmp_path)
 
@@ -196,6 +247,51 @@ def test_package_scripts(tmp_path):
         assert "bin" in script
 
 
+def test_package_scripts_relative(tmp_path, monkeypatch):
+    set_env(tmp_path)
+    make_venv(tmp_path / "venvs", "foo", scripts=("foo", "bar"))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("PIPIS_VENVS", "venvs")
+
+    p = Pipis()
+    scripts = p._package_scripts("foo")
+
+    assert sorted(os.path.basename(script) for script in scripts) == ["bar", "foo"]
+
+
+def test_installed_packages(tmp_path):
+    set_env(tmp_path)
+    venv_dir = make_venv(tmp_path / "venvs", "foo", "1.0.0")
+
+    p = Pipis()
+    index = p._installed_packages()
+
+    assert index["foo"]["version"] == "1.0.0"
+    assert index["foo"]["python"] == "3.6.8"
+    assert index["foo"]["scripts"] == [str(venv_dir / "bin" / "foo")]
+    assert p._read_index() == index
+
+    # simulate an upgrade of the package
+    venv_site = Path(p._venv_site_path("foo"))
+    (venv_site / "foo-1.0.0.dist-info").rename(venv_site / "foo-2.0.0.dist-info")
+    index = p._installed_packages()
+
+    assert index["foo"]["version"] == "2.0.0"
+    assert not index["foo"]["launchers"]
+
+    # the launchers option is recorded, and kept by refreshes and updates
+    p._update_index("foo", launchers=True)
+    (venv_site / "foo-2.0.0.dist-info").rename(venv_site / "foo-3.0.0.dist-info")
+
+    assert p._installed_packages()["foo"]["launchers"]
+    p._update_index("foo")
+    assert p._read_index()["foo"]["launchers"]
+
+    p._remove_index("foo")
+
+    assert "foo" not in p._read_index()
+
+
 def test_requirements_list(tmp_path):
     tmp_requirements_file = tmp_path / "requirements.txt"
     tmp_requirements_file.write_text("pipis\nansible\n# comment\n")
@@ -208,6 +304,46 @@ def test_requirements_list(tmp_path):
     assert "# comment" not in requirements
 
 
+def test_packages_list(tmp_path):
+    tmp_requirements_file = tmp_path / "requirements.txt"
+    tmp_requirements_file.write_text("ansible\n")
+
+    p = Pipis()
+    args = Args(package=["pipis"], requirement=str(tmp_requirements_file))
+
+    assert p._packages_list(args) == ["pipis", "ansible"]
+    with pytest.raises(Exception):
+        p._packages_list(Args(package=[]))
+
+
+def test_run_jobs():
+    def job(package):
+        if package == "fail":
+            raise Exception("failed")
+        return package.upper()
+
+    p = Pipis()
+    results = p._run_jobs(job, ["a", "fail", "b"], jobs=2)
+
+    assert results["a"] == "A"
+    assert results["b"] == "B"
+    assert isinstance(results["fail"], Exception)
+
+
+def test_pip_cmd(tmp_path, monkeypatch):
+    set_env(tmp_path)
+    venv_dir = make_venv(tmp_path / "venvs", "foo")
+    venv_py = str(venv_dir / "bin" / "python")
+
+    p = Pipis()
+
+    # venvs without pip are driven by the pip of pipis
+    assert p._pip_cmd("foo") == [sys.executable, "-m", "pip", "--python", venv_py]
+    monkeypatch.setattr("pip.__version__", "21.3.1")
+    with pytest.raises(Exception, match="need pip>=22.3 in the pipis venv"):
+        p._pip_cmd("foo")
+
+
 def test_add_dependency(tmp_path):
     set_env(tmp_path)
 
@@ -221,6 +357,231 @@ def test_add_dependency(tmp_path):
     assert Path(req_file).read_text() == "abc\ndef"
 
 
+def test_lock_closure(tmp_path):
+    set_env(tmp_path)
+    venv_dir = make_venv(tmp_path / "venvs", "foo")
+    venv_site = venv_dir / "lib" / "python3.6" / "site-packages"
+    for name in ("Bar_Baz-2.0.dist-info", "pip", "pip-21.0.dist-info"):
+        (venv_site / name).mkdir()
+    (venv_site / "Bar_Baz-2.0.dist-info" / "METADATA").write_text("Name: Bar_Baz\n")
+
+    p = Pipis()
+    template_site = Path(p._template_dir_path(), "lib", "python3.6", "site-packages")
+    (template_site / "pip-21.0.dist-info").mkdir(parents=True)
+    p._write_json(
+        p._data_dir_path("wheels.json"),
+        {
+            "foo-1.0.0-py3-none-any.whl": {"sha256": "aaa", "size": 1},
+            "bar_baz-2.0-py2.py3-none-any.whl": {"sha256": "bbb", "size": 1},
+        },
+    )
+    lock = p._write_lock("foo")
+
+    assert p._lock_closure("foo") == [
+        "Bar_Baz==2.0 --hash=sha256:bbb",
+        "foo==1.0.0 --hash=sha256:aaa",
+    ]
+    assert p._read_lock(lock) == {"bar-baz": "2.0", "foo": "1.0.0"}
+    assert p._locked(lock, "foo", "foo")
+    assert p._locked(lock, "foo", "foo==1.0.0")
+    assert not p._locked(lock, "foo", "foo==2.0.0")
+    assert not p._locked(lock, "qux", "qux")
+
+    # without every hash, pins are written without any
+    p._write_json(p._data_dir_path("wheels.json"), {})
+
+    assert p._lock_closure("foo") == ["Bar_Baz==2.0", "foo==1.0.0"]
+
+
+def test_lock_closure_seeds(tmp_path):
+    set_env(tmp_path)
+    venv_dir = make_venv(tmp_path / "venvs", "foo")
+    venv_site = venv_dir / "lib" / "python3.6" / "site-packages"
+    for name in ("pip", "pip-21.0.dist-info", "setuptools-80.0.dist-info"):
+        (venv_site / name).mkdir()
+
+    p = Pipis()
+    template_site = Path(p._template_dir_path(), "lib", "python3.6", "site-packages")
+    for name in ("pip-21.0.dist-info", "setuptools-65.0.dist-info"):
+        (template_site / name).mkdir(parents=True)
+
+    # seed packages are pinned only when they differ from the template ones
+    assert p._lock_closure("foo") == ["foo==1.0.0", "setuptools==80.0"]
+    # venvs without pip are not seeded
+    (venv_site / "pip").rmdir()
+
+    assert p._lock_closure("foo") == [
+        "foo==1.0.0",
+        "pip==21.0",
+        "setuptools==80.0",
+    ]
+
+
+def test_layer_compatible(tmp_path):
+    set_env(tmp_path)
+    venv_dir = make_venv(tmp_path / "venvs", "foo")
+    venv_site = venv_dir / "lib" / "python3.6" / "site-packages"
+    (venv_site / "foo-1.0.0.dist-info" / "METADATA").write_text(
+        'Name: foo\nRequires-Dist: Bar_Baz>=2\nRequires-Dist: qux; extra == "x"\n'
+    )
+    layer = tmp_path / "layer"
+    (layer / "bar_baz-2.0.dist-info").mkdir(parents=True)
+    (layer / "bar_baz-2.0.dist-info" / "METADATA").write_text("Name: Bar_Baz\n")
+    (venv_site / "pipis-layer.pth").write_text(f"{layer}\n")
+
+    p = Pipis()
+
+    assert p._venv_layer("foo") == str(layer)
+    assert p._layer_compatible("foo", ["foo"])
+    assert not p._layer_compatible("foo", ["foo[x]"])
+    # distributions of the venv shadow the ones of the layer
+    (venv_site / "bar.baz-1.0.dist-info").mkdir()
+
+    assert not p._layer_compatible("foo", ["foo"])
+    assert [name for name, _, _ in p._closure_wheels("foo")] == ["bar.baz", "foo"]
+
+
+def test_resolution_cache(tmp_path, monkeypatch):
+    set_env(tmp_path)
+    monkeypatch.delenv("PIP_INDEX_URL", raising=False)
+    lock = tmp_path / "requirements.lock"
+    lock.write_text("foo==1.0.0\n")
+
+    p = Pipis()
+    key = p._resolution_key(["Foo_Bar==1.0", "baz"])
+
+    assert key == p._resolution_key(["baz", "foo-bar==1.0"])
+    assert key != p._resolution_key(["baz", "foo-bar==1.0"], system=True)
+    assert key != p._resolution_key(["baz", "foo-bar==1.0"], with_pip=False)
+    assert p._cached_resolution(key) is None
+
+    p._cache_resolution(key, str(lock))
+
+    assert Path(p._cached_resolution(key)).read_text() == "foo==1.0.0\n"
+    assert p._resolutions_stats() == {"hits": 1, "misses": 1}
+
+    # entries are invalidated by a new index
+    monkeypatch.setenv("PIP_INDEX_URL", "http://invalid.invalid/simple")
+
+    assert p._resolution_key(["baz", "foo-bar==1.0"]) != key
+
+    # or when they expire
+    cached = p._data_dir_path("resolutions", f"{key}.lock")
+    os.utime(cached, (0, 0))
+
+    assert p._cached_resolution(key) is None
+    assert not Path(cached).exists()
+
+
+def test_compile(tmp_path, capsys):
+    set_env(tmp_path)
+    venv_dir = make_venv(tmp_path / "venvs", "foo")
+    (venv_dir / "bin" / "python").symlink_to(sys.executable)
+    venv_site = venv_dir / "lib" / "python3.6" / "site-packages"
+    (venv_site / "foo.py").write_text("FOO = 1\n")
+    (venv_site / "broken.py").write_text("print 'python 2'\n")
+
+    p = Pipis()
+
+    assert p.compile(Args(package=["foo"], optimize=[0, 1])) == ["foo"]
+    captured = capsys.readouterr()
+    pycs = sorted(x.name for x in (venv_site / "__pycache__").iterdir())
+
+    assert "Some files of foo cannot be compiled" in captured.err
+    assert "Successfully compiled foo" in captured.out
+    assert len(pycs) == 2
+    assert pycs[0].startswith("foo.") and pycs[0].endswith(".opt-1.pyc")
+    with pytest.raises(Exception, match="A package or --all is required"):
+        p.compile(Args(package=[]))
+    with pytest.raises(Exception, match="Cannot compile bar"):
+        p.compile(Args(package=["bar"]))
+
+
+def test_write_launchers(tmp_path):
+    set_env(tmp_path)
+    venv_dir = make_venv(tmp_path / "venvs", "foo", scripts=("foo", "foo-gui"))
+    dist_info = venv_dir / "lib" / "python3.6" / "site-packages" / "foo-1.0.0.dist-info"
+    (dist_info / "entry_points.txt").write_text(
+        "[console_scripts]\n"
+        "foo = foo.cli:main [extra]\n"
+        "missing = foo.cli:main\n"
+        "[gui_scripts]\n"
+        "foo-gui = foo.gui:App.run\n"
+    )
+
+    p = Pipis()
+    scripts = p._package_scripts("foo")
+
+    assert sorted(p._write_launchers("foo")) == scripts
+    launcher = (venv_dir / "bin" / "foo-gui").read_text()
+    assert launcher.startswith(f"#!{venv_dir / 'bin' / 'python'}\n")
+    assert "from foo.gui import App\n" in launcher
+    assert "sys.exit(App.run())" in launcher
+    assert "from foo.cli import main\n" in (venv_dir / "bin" / "foo").read_text()
+    assert os.access(venv_dir / "bin" / "foo", os.X_OK)
+
+
+def test_parse_size():
+    p = Pipis()
+
+    assert p._parse_size("0") == 0
+    assert p._parse_size("512") == 512
+    assert p._parse_size("1.5K") == 1536
+    assert p._parse_size("2GB") == 2 * 1024**3
+
+
+def test_format_size():
+    p = Pipis()
+
+    assert p._format_size(512) == "512 B"
+    assert p._format_size(1536) == "1.5 KiB"
+
+
+def test_cache_add_evict(tmp_path):
+    set_env(tmp_path)
+    wheel_dir = tmp_path / "build"
+    wheel_dir.mkdir()
+    (wheel_dir / "a-1.0-py3-none-any.whl").write_bytes(b"a" * 10)
+    (wheel_dir / "b-1.0-py3-none-any.whl").write_bytes(b"b" * 10)
+
+    p = Pipis()
+    Path(p._data_dir_path("wheels")).mkdir(parents=True)
+    added = p._cache_add(str(wheel_dir))
+    wheels = p._cache_wheels()
+
+    assert sorted(added) == ["a-1.0-py3-none-any.whl", "b-1.0-py3-none-any.whl"]
+    assert wheels["a-1.0-py3-none-any.whl"]["size"] == 10
+    assert len(wheels["a-1.0-py3-none-any.whl"]["sha256"]) == 64
+
+    removed = p._cache_evict(15)
+
+    assert len(removed) == 1
+    assert len(p._cache_wheels()) == 1
+
+
+def test_dedupe_venv(tmp_path):
+    set_env(tmp_path)
+    foo_venv = make_venv(tmp_path / "venvs", "foo", scripts=["foo"])
+    bar_venv = make_venv(tmp_path / "venvs", "bar", scripts=["bar"])
+    foo_site = foo_venv / "lib" / "python3.6"
+    bar_site = bar_venv / "lib" / "python3.6"
+    (foo_site / "site-packages" / "mod.py").write_text("same")
+    (bar_site / "site-packages" / "mod.py").write_text("same")
+
+    p = Pipis()
+
+    assert p._dedupe_venv("foo") == 0
+    assert p._dedupe_venv("bar") == 4
+    assert p._dedupe_venv("bar") == 0
+    assert (bar_site / "site-packages" / "mod.py").stat().st_nlink == 3
+
+    rmtree(str(tmp_path / "venvs" / "foo"))
+    rmtree(str(tmp_path / "venvs" / "bar"))
+
+    assert p._store_gc() > 0
+    assert not list(Path(p._data_dir_path("store")).glob("*/*"))
+
+
 def test_show_version(tmp_path):
     p = Pipis()
     args = Args()
@@ -237,15 +598,16 @@ def test_freeze(tmp_path):
     p.install(args)
     freeze = p.freeze(args)
 
-    assert freeze[0].startswith(f"{args.package}==")
+    assert freeze[0]["name"] == args.package
+    assert freeze[0]["version"] == p._package_version(args.package)
+    assert freeze[0]["size"] > 0
 
 
 def test_search(tmp_path):
     set_env(tmp_path)
 
     p = Pipis()
-    args = Args()
-    p.install(args)
+    args = Args(index=make_projects_dump(tmp_path))
     search = p.search(args)
 
     assert "not found" not in search
@@ -256,13 +618,42 @@ def test_search_inexistant(tmp_path):
     set_env(tmp_path)
 
     p = Pipis()
-    args = Args(query="pipistache")
-    p.install(args)
+    args = Args(query="pipistache", index=make_projects_dump(tmp_path))
     search = p.search(args)
 
     assert search == f"Package '{args.query}' not found"
 
 
+def test_search_ranking(tmp_path):
+    set_env(tmp_path)
+
+    p = Pipis()
+    args = Args(query="PIP", index=make_projects_dump(tmp_path))
+    search = p.search(args)
+
+    assert search.splitlines() == [
+        "pipis - Wrapper around pip and venv",
+        "pipx - Install Python applications",
+    ]
+    args.query = "http"
+    assert p.search(args) == "requests - Python HTTP for Humans."
+
+
+def test_refresh_search_incremental(tmp_path):
+    set_env(tmp_path)
+    mirror = tmp_path / "mirror"
+    for project in ("pipis", "foo"):
+        (mirror / project).mkdir(parents=True)
+
+    p = Pipis()
+    p._refresh_search(make_projects_dump(tmp_path))
+    # simple indexes have no summaries, the previous ones are kept
+    assert p._refresh_search(str(mirror)) == 2
+    assert p.search(Args(query="wrapper")) == "pipis - Wrapper around pip and venv"
+    assert p.search(Args(query="foo")) == "foo"
+    assert p.search(Args(query="requests")) == "Package 'requests' not found"
+
+
 def test_install(tmp_path):
     set_env(tmp_path)
 
@@ -341,6 +732,34 @@ def test_install_dependency(tmp_path):
     assert dep_bin.exists()
 
 
+def test_install_multiple_fail(tmp_path):
+    set_env(tmp_path)
+
+    p = Pipis()
+    args = Args(package=["pipis", "requests"], jobs=2)
+
+    with pytest.raises(Exception, match="requests"):
+        p.install(args)
+    venv_dir = p._venv_dir_path("pipis")
+
+    assert Path(venv_dir, "bin", "pipis").exists()
+
+
+def test_install_no_pip(tmp_path):
+    set_env(tmp_path)
+
+    p = Pipis()
+    args = Args(no_pip=True)
+    p.install(args)
+    p.update(args)
+    venv_dir = p._venv_dir_path(args.package)
+    package_bin = Path(venv_dir, "bin", args.package)
+
+    assert package_bin.exists()
+    assert not p._venv_has_pip(args.package)
+    assert "--python" in p._pip_cmd(args.package)
+
+
 def test_install_lib_fail(tmp_path):
     set_env(tmp_path)
 
@@ -374,3 +793,99 @@ def test_uninstall(tmp_path):
     package_bin = Path(venv_dir, "bin", args.package)
 
     assert not package_bin.exists()
+
+
+def test_switch_venv_rollback(tmp_path):
+    set_env(tmp_path)
+    venvs = tmp_path / "venvs"
+    make_venv(venvs, "foo", "1.0.0")
+
+    p = Pipis()
+    p._create_link("foo")
+    # build a new generation, as done by upgrades
+    generation = p._generation_dir_path("foo")
+    Path(generation).parent.mkdir(parents=True)
+    make_venv(tmp_path / "build", "foo", "2.0.0").rename(generation)
+    p._staged["foo"] = generation
+    p._create_link("foo", upgrade=True)
+    del p._staged["foo"]
+    previous = p._switch_venv("foo", generation)
+    link = tmp_path / "bin" / "foo"
+
+    assert (venvs / "foo").is_symlink()
+    assert p._package_version("foo") == "2.0.0"
+    assert str(link.resolve()).startswith(generation)
+    assert p._generations_list("foo") == [previous, generation]
+
+    assert p.rollback(Args(package="foo")) == "1.0.0"
+    assert p._package_version("foo") == "1.0.0"
+    assert str(link.resolve()).startswith(previous)
+    assert p.rollback(Args(package="foo")) == "2.0.0"
+
+    p.uninstall(Args(package="foo"))
+
+    assert not os.path.lexists(venvs / "foo")
+    assert not link.exists()
+    assert p._generations_list("foo") == []
+
+
+def test_switch_venv_relative(tmp_path, monkeypatch):
+    set_env(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("PIPIS_VENVS", "venvs")
+    generation = make_venv(tmp_path / "build", "foo", "1.0.0")
+
+    p = Pipis()
+    p._switch_venv("foo", os.path.relpath(generation))
+
+    assert os.path.isabs(os.readlink(tmp_path / "venvs" / "foo"))
+    assert p._package_version("foo") == "1.0.0"
+
+    # upgrades keep the previous generation for rollback
+    for version in ("2.0.0", "3.0.0"):
+        generation = p._generation_dir_path("foo")
+        Path(generation).parent.mkdir(parents=True, exist_ok=True)
+        make_venv(tmp_path / version, "foo", version).rename(generation)
+        previous = p._switch_venv("foo", generation)
+        p._generations_gc("foo", [generation, previous])
+
+    assert len(p._generations_list("foo")) == 2
+    assert p.rollback(Args(package="foo")) == "2.0.0"
+
+
+def test_bin_links(tmp_path, capsys):
+    set_env(tmp_path)
+    venvs = tmp_path / "venvs"
+    make_venv(venvs, "foo", scripts=("foo", "common"))
+    make_venv(venvs, "bar", scripts=("bar", "common"))
+    (tmp_path / "bin" / "other").write_text("#!/bin/sh\n")
+
+    p = Pipis()
+    p._create_link("foo")
+    p._create_link("bar")
+    captured = capsys.readouterr()
+
+    assert "Script 'common' conflicts with package 'foo'" in captured.err
+    assert {name: owner for name, (_, owner) in p._bin_links().items()} == {
+        "foo": "foo",
+        "bar": "bar",
+        "common": "foo",
+        "other": None,
+    }
+    assert p.which(Args(script="common")) == "foo"
+    with pytest.raises(Exception, match="not linked by pipis"):
+        p.which(Args(script="other"))
+
+    p._unlink_scripts("foo")
+
+    assert sorted(p._bin_links()) == ["bar", "other"]
+
+
+def test_rollback_no_previous(tmp_path):
+    set_env(tmp_path)
+    make_venv(tmp_path / "venvs", "foo")
+
+    p = Pipis()
+
+    with pytest.raises(Exception, match="no previous venv"):
+        p.rollback(Args(package="foo"))